@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Citas Hospital Santa Rosa',
-    'version': '18.0.1.0.0',
+    'version': '18.0.1.1.0',
     'category': 'Healthcare',
     'summary': 'Sistema de gestion de citas medicas y recetas',
     'author': 'Hospital Santa Rosa',
@@ -30,7 +30,11 @@
         'views/hospital_specialty_views.xml',
         'views/hospital_appointment_views.xml',
         'views/hospital_schedule_views.xml',
+        'views/hospital_slot_views.xml',
         'views/hospital_prescription_views.xml',
+        'views/hospital_notification_views.xml',
+        'views/hospital_cron_run_views.xml',
+        'views/hospital_audit_log_views.xml',
         'views/product_product_views.xml',
         'views/dashboard_views.xml',
         'views/menu.xml',
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""Benchmark de los flujos de reserva y confirmación de citas
+
+Se ejecuta dentro de un shell de Odoo sobre una base de datos de pruebas:
+    
+    odoo-bin shell -c /etc/odoo18.conf -d citas_bench < benchmarks/booking_benchmark.py
+
+El volumen de datos se configura con variables de entorno:
+    
+    BENCH_DOCTORS       Doctores a crear (50)
+    BENCH_PATIENTS      Pacientes a crear (5000)
+    BENCH_APPOINTMENTS  Citas a crear (50000)
+    BENCH_SAMPLE        Registros por operación en lote (100)
+    BENCH_SEED          1 para crear los datos, 0 para reutilizar los existentes (1)
+
+Los datos de prueba se identifican con el prefijo BENCH y se confirman en la
+base de datos. Cada medición se ejecuta en un savepoint que se revierte, por
+lo que las mediciones se pueden repetir sobre los mismos datos. Para cada
+operación se informa el tiempo total y la cantidad de consultas SQL.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta
+import os
+import threading
+import time
+
+from odoo.addons.citas_hospital.models import hospital_availability_cache
+
+SEED_CODE = 'BENCH'
+# Slots de 30 minutos entre las 8:00 y las 20:00, todos los días
+SLOTS_PER_DAY = 24
+# Las citas de prueba ocupan uno de cada dos slots para dejar horarios libres
+BOOKED_PER_DAY = SLOTS_PER_DAY // 2
+CHUNK_SIZE = 5000
+
+
+class _Rollback(Exception):
+    """Revierte el savepoint de una medición"""
+
+
+def _config(name, default):
+    return int(os.environ.get(name, default))
+
+
+def seed(env, doctors_count, patients_count, appointments_count):
+    """Crea especialidad, doctores, horarios, pacientes y citas de prueba"""
+    specialty = env['hospital.specialty'].search([('code', '=', SEED_CODE)], limit=1)
+    if not specialty:
+        specialty = env['hospital.specialty'].create({'name': 'Benchmark', 'code': SEED_CODE})
+    
+    doctors = env['hospital.doctor'].create([{
+        'name': f'Doctor {SEED_CODE} {index}',
+        'license_number': f'{SEED_CODE}-{index:06d}',
+        'specialty_ids': [(6, 0, specialty.ids)],
+    } for index in range(doctors_count)])
+    env['hospital.schedule'].create([{
+        'doctor_id': doctor.id,
+        'day_of_week': str(day),
+        'hour_from': 8.0,
+        'hour_to': 20.0,
+        'slot_duration': 30.0,
+    } for doctor in doctors for day in range(7)])
+    env.cr.commit()
+    
+    patient_ids = []
+    for offset in range(0, patients_count, CHUNK_SIZE):
+        patients = env['hospital.patient'].create([{
+            'name': f'Paciente {SEED_CODE} {index}',
+            'identification_id': f'{SEED_CODE}{index:08d}',
+            'email': f'paciente{index}@bench.example.com',
+        } for index in range(offset, min(offset + CHUNK_SIZE, patients_count))])
+        patient_ids += patients.ids
+        env.cr.commit()
+    
+    # La mitad de las citas en el pasado (realizadas) y la otra mitad en el
+    # futuro (borradores y confirmadas), sin solapamientos por doctor y
+    # dejando libre uno de cada dos slots
+    per_doctor = max(appointments_count // max(doctors_count, 1), 1)
+    first_day = datetime.combine(datetime.now().date(), dt_time.min) - timedelta(days=per_doctor // BOOKED_PER_DAY // 2)
+    now = datetime.now()
+    
+    vals_list = []
+    for doctor_index, doctor in enumerate(doctors):
+        for index in range(per_doctor):
+            start = first_day + timedelta(days=index // BOOKED_PER_DAY, hours=8, minutes=60 * (index % BOOKED_PER_DAY))
+            if start < now:
+                state = 'done'
+            else:
+                state = 'confirmed' if index % 3 == 0 else 'draft'
+            vals_list.append({
+                'patient_id': patient_ids[(doctor_index * per_doctor + index) % len(patient_ids)],
+                'doctor_id': doctor.id,
+                'specialty_id': specialty.id,
+                'appointment_date': start,
+                'state': state,
+            })
+            if len(vals_list) >= CHUNK_SIZE:
+                env['hospital.appointment'].create(vals_list)
+                env.cr.commit()
+                vals_list = []
+    if vals_list:
+        env['hospital.appointment'].create(vals_list)
+    env.cr.commit()
+
+
+def clear_availability_cache():
+    """Vacía la caché de disponibilidad del proceso para medir en frío"""
+    with hospital_availability_cache._lock:
+        hospital_availability_cache._caches.clear()
+
+
+def fill_availability_cache(env, doctors, day):
+    """Calcula y guarda en la caché los slots de los doctores sin confirmar la transacción
+    
+    La caché se llena en postcommit, que no se ejecuta al revertir el
+    savepoint de una medición.
+    """
+    env.cr.postcommit.clear()
+    doctors._get_availability(day, day)
+    env.cr.postcommit.run()
+
+
+@contextmanager
+def measure(env, name, results):
+    """Mide tiempo y consultas SQL de un bloque y revierte sus cambios"""
+    env.flush_all()
+    env.invalidate_all()
+    queries = env.cr.sql_log_count
+    start = time.perf_counter()
+    try:
+        with env.cr.savepoint():
+            yield
+            env.flush_all()
+            results.append((name, time.perf_counter() - start, env.cr.sql_log_count - queries))
+            raise _Rollback()
+    except _Rollback:
+        pass
+    env.invalidate_all()
+
+
+def run(env, sample):
+    """Ejecuta las mediciones y devuelve [(operación, segundos, consultas)]"""
+    results = []
+    Appointment = env['hospital.appointment']
+    doctors = env['hospital.doctor'].search([('license_number', '=like', f'{SEED_CODE}-%')], limit=sample)
+    specialty = env['hospital.specialty'].search([('code', '=', SEED_CODE)], limit=1)
+    day = datetime.now().date() + timedelta(days=1)
+    
+    clear_availability_cache()
+    with measure(env, 'get_available_slots (frío)', results):
+        for doctor in doctors:
+            doctor._get_available_slots(day)
+    fill_availability_cache(env, doctors, day)
+    with measure(env, 'get_available_slots (caché)', results):
+        for doctor in doctors:
+            doctor._get_available_slots(day)
+    
+    # Horarios libres para las nuevas reservas
+    bookings = []
+    availability = doctors._get_availability(day, day + timedelta(days=7))
+    for doctor in doctors:
+        for slots in availability[doctor.id].values():
+            if slots:
+                bookings.append({
+                    'identification_id': f'{SEED_CODE}NEW{len(bookings):06d}',
+                    'patient_name': f'Paciente Nuevo {len(bookings)}',
+                    'email': f'nuevo{len(bookings)}@bench.example.com',
+                    'doctor_id': doctor.id,
+                    'specialty_id': specialty.id,
+                    'appointment_datetime': slots[0]['datetime'],
+                })
+                break
+    if not bookings:
+        raise RuntimeError("No hay horarios libres para las reservas de prueba en los próximos 7 días")
+    
+    with measure(env, 'create_appointment (1 reserva)', results):
+        Appointment._create_bookings(bookings[:1])
+    with measure(env, f'create_appointment ({len(bookings)} reservas)', results):
+        Appointment._create_bookings(bookings)
+    
+    drafts = Appointment.search([
+        ('doctor_id', 'in', doctors.ids),
+        ('state', '=', 'draft'),
+        ('appointment_date', '>', datetime.now()),
+    ], limit=sample)
+    with measure(env, f'_check_doctor_availability ({len(drafts)} citas)', results):
+        drafts._check_doctor_availability()
+    with measure(env, f'action_confirm ({len(drafts)} citas)', results):
+        drafts.action_confirm()
+    
+    # Los crons no deben confirmar la transacción durante la medición
+    thread = threading.current_thread()
+    testing = getattr(thread, 'testing', False)
+    thread.testing = True
+    try:
+        with measure(env, '_cron_send_reminders_24h', results):
+            Appointment._cron_send_reminders_24h()
+        with measure(env, '_cron_send_reminders_2h', results):
+            Appointment._cron_send_reminders_2h()
+        with measure(env, '_cron_auto_cancel_unconfirmed', results):
+            Appointment._cron_auto_cancel_unconfirmed()
+    finally:
+        thread.testing = testing
+    
+    return results
+
+
+def main(env):
+    if _config('BENCH_SEED', 1):
+        seed(
+            env,
+            _config('BENCH_DOCTORS', 50),
+            _config('BENCH_PATIENTS', 5000),
+            _config('BENCH_APPOINTMENTS', 50000),
+        )
+    
+    results = run(env, _config('BENCH_SAMPLE', 100))
+    env.cr.rollback()
+    
+    print(f"{'Operación':<45} {'Segundos':>10} {'Consultas':>10}")
+    for name, seconds, queries in results:
+        print(f"{name:<45} {seconds:>10.3f} {queries:>10}")
+
+
+if 'env' in globals():
+    main(env)
@@ -2,9 +2,22 @@
 
 from odoo import http, _
 from odoo.http import request
+from odoo.exceptions import AccessError, ConcurrencyError, UserError
+from psycopg2 import errors as pg_errors
 import json
+import time
 from datetime import datetime, timedelta
 
+# Máximo de días que se pueden consultar en una sola llamada de disponibilidad
+MAX_AVAILABILITY_DAYS = 62
+# Máximo de slots devueltos por la búsqueda de primer horario disponible
+MAX_FIRST_AVAILABLE = 20
+# Máximo de reservas por llamada al endpoint de reservas en lote
+MAX_BATCH_BOOKINGS = 1000
+# Máximo de reservas temporales de slots por sesión en cada ventana de segundos
+HOLD_RATE_LIMIT = 10
+HOLD_RATE_WINDOW = 60
+
 
 class HospitalWebsite(http.Controller):
     
@@ -40,67 +53,123 @@ class HospitalWebsite(http.Controller):
         """Obtiene slots disponibles para un doctor en una fecha (AJAX)"""
         doctor = request.env['hospital.doctor'].sudo().browse(int(doctor_id))
         date_obj = datetime.strptime(date, '%Y-%m-%d')
-        day_of_week = str(date_obj.weekday())
         
-        # Buscar horarios del doctor para ese día
-        schedules = request.env['hospital.schedule'].sudo().search([
-            ('doctor_id', '=', doctor.id),
-            ('day_of_week', '=', day_of_week),
-            ('active', '=', True)
-        ])
+        return doctor._get_available_slots(date_obj.date())
+    
+    @http.route(['/appointments/booking/get_availability'], type='json', auth="public", website=True)
+    def get_availability(self, date_from, date_to, doctor_id=None, specialty_id=None, **kw):
+        """Obtiene los slots libres por día de un doctor o especialidad en un rango (AJAX)"""
+        date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
+        date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
+        if date_to < date_from or (date_to - date_from).days > MAX_AVAILABILITY_DAYS:
+            return {'error': _('El rango de fechas no es válido.')}
         
-        if not schedules:
+        Doctor = request.env['hospital.doctor'].sudo()
+        if doctor_id:
+            doctors = Doctor.browse(int(doctor_id)).exists()
+        elif specialty_id:
+            doctors = Doctor.search([
+                ('specialty_ids', 'in', [int(specialty_id)]),
+                ('active', '=', True)
+            ])
+        else:
+            return {'error': _('Debe indicar un doctor o una especialidad.')}
+        
+        availability = doctors._get_availability(date_from, date_to)
+        
+        days = []
+        day = date_from
+        while day <= date_to:
+            slots = sorted((
+                dict(slot, doctor_id=doctor.id, doctor_name=doctor.name)
+                for doctor in doctors
+                for slot in availability[doctor.id].get(day, [])
+            ), key=lambda slot: slot['datetime'])
+            days.append({
+                'date': day.strftime('%Y-%m-%d'),
+                'free_count': len(slots),
+                'slots': slots,
+            })
+            day += timedelta(days=1)
+        
+        return {'days': days}
+    
+    @http.route(['/appointments/booking/first_available'], type='json', auth="public", website=True)
+    def get_first_available(self, specialty_id, limit=5, date_from=None, **kw):
+        """Obtiene los primeros slots libres de cualquier doctor de la especialidad (AJAX)"""
+        specialty = request.env['hospital.specialty'].sudo().browse(int(specialty_id)).exists()
+        if not specialty:
             return []
         
-        slots = []
-        for schedule in schedules:
-            # Generar slots
-            current_time = schedule.hour_from
-            while current_time < schedule.hour_to:
-                hour = int(current_time)
-                minute = int((current_time - hour) * 60)
-                slot_datetime = date_obj.replace(hour=hour, minute=minute)
-                
-                # Verificar si el slot está ocupado
-                existing_appointments = request.env['hospital.appointment'].sudo().search_count([
-                    ('doctor_id', '=', doctor.id),
-                    ('appointment_date', '>=', slot_datetime),
-                    ('appointment_date', '<', slot_datetime + timedelta(minutes=schedule.slot_duration)),
-                    ('state', 'in', ['draft', 'confirmed', 'in_progress'])
-                ])
-                
-                if existing_appointments == 0 and slot_datetime > datetime.now():
-                    slots.append({
-                        'time': slot_datetime.strftime('%H:%M'),
-                        'datetime': slot_datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                        'available': True
-                    })
-                
-                current_time += schedule.slot_duration / 60.0
-        
-        return slots
+        try:
+            limit = max(1, min(int(limit), MAX_FIRST_AVAILABLE))
+        except (TypeError, ValueError):
+            return {'error': _('El límite debe ser un número entero.')}
+        
+        if date_from:
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
+        
+        return specialty._find_first_available_slots(
+            limit=limit,
+            date_from=date_from,
+            max_days=MAX_AVAILABILITY_DAYS,
+        )
+    
+    @http.route(['/appointments/booking/hold'], type='json', auth="public", website=True)
+    def hold_slot(self, doctor_id, datetime_str, **kw):
+        """Reserva temporalmente un slot mientras se completa la reserva (AJAX)
+        
+        Cada sesión tiene como máximo un hold vigente: el token se guarda en
+        la sesión y el hold anterior se libera al crear el nuevo.
+        """
+        now = time.time()
+        attempts = [
+            attempt for attempt in request.session.get('hospital_hold_attempts', [])
+            if now - attempt < HOLD_RATE_WINDOW
+        ]
+        if len(attempts) >= HOLD_RATE_LIMIT:
+            return {'error': _('Demasiados intentos. Espere un momento e inténtelo de nuevo.')}
+        request.session['hospital_hold_attempts'] = attempts + [now]
+        
+        try:
+            hold = request.env['hospital.slot.hold'].sudo()._create_hold(
+                int(doctor_id),
+                datetime.strptime(datetime_str, '%Y-%m-%d %H:%M:%S'),
+                release_token=request.session.pop('hospital_hold_token', None),
+                ip_address=request.httprequest.remote_addr,
+            )
+        except UserError as e:
+            return {'error': str(e)}
+        
+        request.session['hospital_hold_token'] = hold.token
+        return {
+            'expiration': hold.expiration.strftime('%Y-%m-%d %H:%M:%S'),
+        }
     
     @http.route(['/appointments/booking/create'], type='http', auth="public", website=True, methods=['POST'], csrf=False)
     def create_appointment(self, **post):
         """Crea una nueva cita desde el website"""
         try:
-            # Buscar o crear paciente
-            patient = request.env['hospital.patient'].sudo().search([
-                ('identification_id', '=', post.get('identification_id'))
-            ], limit=1)
+            appointment_datetime = datetime.strptime(post.get('appointment_datetime'), '%Y-%m-%d %H:%M:%S')
             
-            if not patient:
-                # Crear nuevo paciente
-                patient = request.env['hospital.patient'].sudo().create({
-                    'name': post.get('patient_name'),
-                    'identification_id': post.get('identification_id'),
-                    'phone': post.get('phone'),
-                    'email': post.get('email'),
-                })
+            # El slot debe estar retenido por esta sesión: el hold se creó solo
+            # si el slot estaba libre y excluye a los demás pacientes
+            hold = request.env['hospital.slot.hold'].sudo()._get_live_hold(
+                request.session.get('hospital_hold_token'), int(post.get('doctor_id')), appointment_datetime
+            )
+            if not hold:
+                raise UserError(_('La reserva temporal del horario expiró o no corresponde al horario enviado. Seleccione nuevamente el horario.'))
             
-            # Crear cita
-            appointment_datetime = datetime.strptime(post.get('appointment_datetime'), '%Y-%m-%d %H:%M:%S')
+            # Buscar o crear paciente por identificación normalizada
+            identification = post.get('identification_id')
+            patient = request.env['hospital.patient'].sudo()._resolve_patients([{
+                'name': post.get('patient_name'),
+                'identification_id': identification,
+                'phone': post.get('phone'),
+                'email': post.get('email'),
+            }])[identification]
             
+            # Crear cita
             appointment = request.env['hospital.appointment'].sudo().create({
                 'patient_id': patient.id,
                 'doctor_id': int(post.get('doctor_id')),
@@ -109,12 +178,28 @@ class HospitalWebsite(http.Controller):
                 'reason': post.get('reason', ''),
                 'state': 'draft',
             })
+            hold.unlink()
+            request.session.pop('hospital_hold_token', None)
             
             return request.render("citas_hospital.website_booking_success", {
                 'appointment': appointment,
             })
         
+        except (pg_errors.SerializationFailure, ConcurrencyError):
+            # Odoo reintenta la petición ante accesos concurrentes
+            raise
         except Exception as e:
             return request.render("citas_hospital.website_booking_error", {
                 'error': str(e),
             })
+    
+    @http.route(['/appointments/booking/batch'], type='json', auth="user", methods=['POST'])
+    def create_appointments_batch(self, bookings, **kw):
+        """Crea citas en lote para integraciones externas (call center)"""
+        if not request.env.user.has_group('citas_hospital.group_hospital_receptionist'):
+            raise AccessError(_('No tiene permisos para crear citas.'))
+        
+        if not isinstance(bookings, list) or len(bookings) > MAX_BATCH_BOOKINGS:
+            return {'error': _('Debe enviar una lista de hasta %s reservas.') % MAX_BATCH_BOOKINGS}
+        
+        return {'results': request.env['hospital.appointment']._create_bookings(bookings)}
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Prepara la identificación normalizada y los marcadores de recordatorio
+
+Antes de crear la restricción única sobre identification_normalized se
+calcula la columna en SQL, con la misma normalización que
+normalize_identification. Los pacientes con la misma identificación no se
+fusionan ni se eliminan: el activo más antiguo conserva la identificación
+normalizada, los demás quedan con NULL y se informan en el log para que el
+personal los fusione a mano.
+"""
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    if not version:
+        return
+    
+    _mark_reminders_sent(cr)
+    _normalize_identifications(cr)
+
+
+def _normalize_identifications(cr):
+    """Calcula la identificación normalizada dejando en NULL los duplicados"""
+    cr.execute("ALTER TABLE hospital_patient ADD COLUMN IF NOT EXISTS identification_normalized varchar")
+    cr.execute("""
+        WITH normalized AS (
+            SELECT id, NULLIF(UPPER(regexp_replace(identification_id, '[^0-9A-Za-z]', '', 'g')), '') AS value
+              FROM hospital_patient
+        ), ranked AS (
+            SELECT normalized.id, normalized.value,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY normalized.value
+                       ORDER BY patient.active IS TRUE DESC, patient.id
+                   ) AS position
+              FROM normalized
+              JOIN hospital_patient patient ON patient.id = normalized.id
+        )
+        UPDATE hospital_patient patient
+           SET identification_normalized = CASE WHEN ranked.position = 1 THEN ranked.value END
+          FROM ranked
+         WHERE ranked.id = patient.id
+    """)
+    
+    cr.execute("""
+        SELECT UPPER(regexp_replace(identification_id, '[^0-9A-Za-z]', '', 'g')) AS value,
+               array_agg(id ORDER BY active IS TRUE DESC, id),
+               array_agg(identification_id ORDER BY active IS TRUE DESC, id)
+          FROM hospital_patient
+         WHERE regexp_replace(identification_id, '[^0-9A-Za-z]', '', 'g') != ''
+      GROUP BY value
+        HAVING COUNT(*) > 1
+      ORDER BY value
+    """)
+    for value, patient_ids, identifications in cr.fetchall():
+        _logger.warning(
+            "Pacientes duplicados por identificación %s: %s (ids %s). El paciente %s conserva la "
+            "identificación normalizada; fusione los demás a mano",
+            value, ', '.join(identifications), patient_ids, patient_ids[0]
+        )
+
+
+def _mark_reminders_sent(cr):
+    """Marca como enviado el recordatorio de 24 horas de las citas ya en su ventana
+    
+    Los marcadores de recordatorio son nuevos; sin esto las citas
+    confirmadas de las próximas 24 horas recibirían de nuevo el recordatorio
+    que el cron anterior ya envió.
+    """
+    cr.execute("ALTER TABLE hospital_appointment ADD COLUMN IF NOT EXISTS reminder_24h_sent boolean")
+    cr.execute("""
+        UPDATE hospital_appointment
+           SET reminder_24h_sent = TRUE
+         WHERE state = 'confirmed'
+           AND appointment_date > (now() at time zone 'UTC')
+           AND appointment_date <= (now() at time zone 'UTC') + interval '1 day'
+    """)
@@ -1,10 +1,19 @@
 # -*- coding: utf-8 -*-
 
+from . import hospital_batch_mixin
+from . import hospital_cron_run
+from . import hospital_bulk_mixin
+from . import hospital_audit_log
 from . import hospital_patient
 from . import hospital_doctor
 from . import hospital_specialty
 from . import hospital_appointment
 from . import hospital_schedule
+from . import hospital_slot
+from . import hospital_slot_hold
+from . import hospital_availability_cache
+from . import hospital_notification
 from . import hospital_prescription
 from . import hospital_prescription_line
 from . import product_product
+from . import ir_sequence
@@ -1,15 +1,32 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError, UserError
+from odoo.exceptions import ConcurrencyError, ValidationError, UserError
+from odoo.tools import ormcache, sql
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from psycopg2 import errors as pg_errors
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Campos de la cita que se reflejan en su evento de calendario y los campos
+# del evento que dependen de cada uno
+CALENDAR_EVENT_FIELDS = {
+    'patient_id': ('name',),
+    'doctor_id': ('name', 'location'),
+    'appointment_date': ('start', 'stop'),
+    'duration': ('stop',),
+    'reason': ('description',),
+}
 
 
 class HospitalAppointment(models.Model):
     """Modelo para gestionar citas médicas"""
     _name = 'hospital.appointment'
     _description = 'Cita Médica'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['hospital.bulk.mixin', 'mail.thread', 'mail.activity.mixin', 'hospital.batch.mixin']
     _order = 'appointment_date desc'
     
     name = fields.Char(
@@ -96,6 +113,16 @@ class HospitalAppointment(models.Model):
         string='Motivo de Cancelación',
         tracking=True
     )
+    reminder_24h_sent = fields.Boolean(
+        string='Recordatorio 24h Enviado',
+        copy=False,
+        readonly=True
+    )
+    reminder_2h_sent = fields.Boolean(
+        string='Recordatorio 2h Enviado',
+        copy=False,
+        readonly=True
+    )
     
     # Constraint SQL
     _sql_constraints = [
@@ -103,53 +130,286 @@ class HospitalAppointment(models.Model):
          'El número de cita debe ser único!')
     ]
     
-    @api.model
-    def create(self, vals):
-        """Genera secuencia automática al crear"""
-        if vals.get('name', _('Nuevo')) == _('Nuevo'):
-            vals['name'] = self.env['ir.sequence'].next_by_code('hospital.appointment') or _('Nuevo')
+    def init(self):
+        """Crea el rango horario almacenado y la restricción de no solapamiento
         
-        result = super(HospitalAppointment, self).create(vals)
+        time_range es una columna generada por PostgreSQL a partir de la fecha
+        y la duración. La restricción de exclusión impide que un doctor tenga
+        dos citas confirmadas o en progreso que se solapen, también ante
+        confirmaciones concurrentes.
+        """
+        cr = self.env.cr
+        # Índice para las búsquedas por estado y fecha de los crons
+        sql.create_index(cr, 'hospital_appointment_state_date_index', self._table, ['state', 'appointment_date'])
+        if not sql.column_exists(cr, self._table, 'time_range'):
+            cr.execute("""
+                ALTER TABLE hospital_appointment
+                ADD COLUMN time_range tsrange
+                GENERATED ALWAYS AS (
+                    tsrange(appointment_date, appointment_date + COALESCE(duration, 0) * interval '1 hour')
+                ) STORED
+            """)
+        if not sql.constraint_definition(cr, self._table, 'hospital_appointment_doctor_no_overlap'):
+            try:
+                with cr.savepoint(flush=False):
+                    cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+                    cr.execute("""
+                        ALTER TABLE hospital_appointment
+                        ADD CONSTRAINT hospital_appointment_doctor_no_overlap
+                        EXCLUDE USING gist (doctor_id WITH =, time_range WITH &&)
+                        WHERE (state IN ('confirmed', 'in_progress'))
+                    """)
+            except pg_errors.Error as e:
+                _logger.warning(
+                    "No se pudo crear la restricción de no solapamiento de citas, "
+                    "se verificará la disponibilidad en Python: %s", e
+                )
+            self.env.registry.clear_cache()
+    
+    @ormcache()
+    def _has_overlap_constraint(self):
+        """Indica si la base de datos tiene la restricción de no solapamiento"""
+        return bool(sql.constraint_definition(self.env.cr, self._table, 'hospital_appointment_doctor_no_overlap'))
+    
+    def _check_overlap_fallback(self):
+        """Verifica en Python la disponibilidad si falta la restricción de no solapamiento"""
+        records = self.filtered(lambda record: record.state in ('confirmed', 'in_progress'))
+        if records and not self._has_overlap_constraint():
+            records._check_doctor_availability()
+    
+    @contextmanager
+    def _check_overlap_violation(self):
+        """Convierte las violaciones de la restricción de solapamiento en ValidationError
         
-        # Crear evento en calendario
-        if result.state == 'confirmed':
-            result._create_calendar_event()
+        El savepoint se abre sin flush del cursor, que ejecutaría los hooks
+        precommit y adelantaría la sincronización de calendario diferida; los
+        cambios se escriben con flush_all antes y dentro del savepoint.
+        """
+        self.env.flush_all()
+        try:
+            with self.env.cr.savepoint(flush=False):
+                yield
+                self.env.flush_all()
+        except pg_errors.ExclusionViolation:
+            self.env.invalidate_all(flush=False)
+            raise ValidationError(
+                _('El doctor ya tiene una cita programada en este horario.')
+            )
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Genera las secuencias del lote al crear"""
+        new_vals = [vals for vals in vals_list if vals.get('name', _('Nuevo')) == _('Nuevo')]
+        names = self.env['ir.sequence']._next_by_code_batch('hospital.appointment', len(new_vals))
+        for vals, name in zip(new_vals, names):
+            vals['name'] = name or _('Nuevo')
+        
+        if any(vals.get('state') in ('confirmed', 'in_progress') for vals in vals_list):
+            with self._check_overlap_violation():
+                result = super(HospitalAppointment, self).create(vals_list)
+            result._check_overlap_fallback()
+        else:
+            result = super(HospitalAppointment, self).create(vals_list)
+        
+        # Crear los eventos en calendario de las citas confirmadas
+        result.filtered(lambda record: record.state == 'confirmed')._create_calendar_events()
+        
+        # Marcar el slot de agenda como ocupado
+        self._sync_availability(result._get_slot_keys())
         
         return result
     
     def write(self, vals):
-        """Override para manejar eventos de calendario"""
-        result = super(HospitalAppointment, self).write(vals)
+        """Override para validar solapamientos y manejar calendario y slots de agenda"""
+        if 'appointment_date' in vals:
+            # Una cita reprogramada debe volver a recibir sus recordatorios
+            vals = dict(vals, reminder_24h_sent=False, reminder_2h_sent=False)
+        update_slots = bool(set(vals) & {'doctor_id', 'appointment_date', 'state'})
+        slot_keys = self._get_slot_keys() if update_slots else set()
         
-        # Actualizar evento de calendario si existe
-        for record in self:
-            if record.calendar_event_id and record.state == 'confirmed':
-                record._update_calendar_event()
-            elif record.state == 'cancelled' and record.calendar_event_id:
-                record.calendar_event_id.unlink()
-                record.calendar_event_id = False
+        if set(vals) & {'doctor_id', 'appointment_date', 'duration', 'state'}:
+            with self._check_overlap_violation():
+                result = super(HospitalAppointment, self).write(vals)
+            self._check_overlap_fallback()
+        else:
+            result = super(HospitalAppointment, self).write(vals)
+        
+        if update_slots:
+            self._sync_availability(slot_keys | self._get_slot_keys())
+        
+        # Actualizar los eventos de calendario solo si cambió algún dato del evento
+        calendar_fields = set(vals) & set(CALENDAR_EVENT_FIELDS)
+        if calendar_fields:
+            self._schedule_calendar_sync(calendar_fields)
+        
+        # Eliminar en una sola operación los eventos de las citas canceladas
+        cancelled = self.filtered(lambda r: r.state == 'cancelled' and r.calendar_event_id)
+        if cancelled:
+            events = cancelled.calendar_event_id
+            super(HospitalAppointment, cancelled).write({'calendar_event_id': False})
+            events.unlink()
         
         return result
     
+    def unlink(self):
+        """Libera los slots de agenda de las citas eliminadas"""
+        slot_keys = self._get_slot_keys()
+        result = super(HospitalAppointment, self).unlink()
+        self._sync_availability(slot_keys)
+        return result
+    
+    def _get_slot_keys(self):
+        """Pares (doctor_id, fecha) de slots de agenda afectados por las citas"""
+        return {
+            (record.doctor_id.id, record.appointment_date.date())
+            for record in self
+            if record.doctor_id and record.appointment_date
+        }
+    
+    @api.model
+    def _sync_availability(self, slot_keys):
+        """Propaga cambios de citas a los slots de agenda y a la caché de disponibilidad"""
+        if not slot_keys:
+            return
+        self.env['hospital.slot'].sudo()._sync_slot_keys(slot_keys)
+        self.env['hospital.availability.invalidation'].sudo()._invalidate(slot_keys)
+    
+    @api.model
+    def _create_bookings(self, bookings):
+        """Crea citas en lote desde integraciones externas
+        
+        Cada reserva es un dict con los datos del paciente (identification_id,
+        patient_name, phone, email), de la cita (doctor_id, specialty_id,
+        appointment_datetime, reason) y opcionalmente el hold_token del slot
+        retenido. Los pacientes se resuelven en lote y las citas se crean en
+        un solo create; si este falla se reintenta cita por cita para informar
+        el error de cada una. Devuelve un resultado por reserva, en el mismo
+        orden.
+        """
+        results = [None] * len(bookings)
+        pending = []
+        for index, booking in enumerate(bookings):
+            try:
+                pending.append((index, *self._prepare_booking_values(booking)))
+            except (UserError, TypeError, ValueError) as e:
+                results[index] = {'success': False, 'error': str(e)}
+        
+        # Descartar horarios retenidos por otro paciente
+        Hold = self.env['hospital.slot.hold'].sudo()
+        blocked = Hold._check_holds([
+            (vals['doctor_id'], vals['appointment_date'], bookings[index].get('hold_token'))
+            for index, patient_vals, vals in pending
+        ])
+        for index, patient_vals, vals in pending:
+            if (vals['doctor_id'], vals['appointment_date']) in blocked:
+                results[index] = {
+                    'success': False,
+                    'error': _('El horario seleccionado está reservado temporalmente.'),
+                }
+        pending = [item for item in pending if results[item[0]] is None]
+        
+        # Resolver o crear pacientes
+        Patient = self.env['hospital.patient']
+        try:
+            with self.env.cr.savepoint():
+                patients = Patient._resolve_patients([patient_vals for index, patient_vals, vals in pending])
+        except (pg_errors.SerializationFailure, ConcurrencyError):
+            # Paciente creado por una transacción concurrente: Odoo reintenta
+            raise
+        except Exception:
+            patients = {}
+            for index, patient_vals, vals in pending:
+                try:
+                    with self.env.cr.savepoint():
+                        patients.update(Patient._resolve_patients([patient_vals]))
+                except (pg_errors.SerializationFailure, ConcurrencyError):
+                    raise
+                except Exception as e:
+                    results[index] = {'success': False, 'error': str(e)}
+            pending = [item for item in pending if results[item[0]] is None]
+        
+        for index, patient_vals, vals in pending:
+            vals['patient_id'] = patients[patient_vals['identification_id']].id
+        
+        # Crear citas
+        try:
+            with self.env.cr.savepoint():
+                appointments = self.create([vals for index, patient_vals, vals in pending])
+            created = list(zip(pending, appointments))
+        except Exception:
+            created = []
+            for item in pending:
+                try:
+                    with self.env.cr.savepoint():
+                        created.append((item, self.create(item[2])))
+                except Exception as e:
+                    results[item[0]] = {'success': False, 'error': str(e)}
+        
+        # Liberar los holds propios solo de las citas creadas
+        Hold._release_holds([
+            (vals['doctor_id'], vals['appointment_date'], bookings[index].get('hold_token'))
+            for (index, patient_vals, vals), appointment in created
+        ])
+        for (index, patient_vals, vals), appointment in created:
+            results[index] = {
+                'success': True,
+                'appointment_id': appointment.id,
+                'name': appointment.name,
+                'patient_id': appointment.patient_id.id,
+            }
+        
+        return results
+    
+    @api.model
+    def _prepare_booking_values(self, booking):
+        """Valores de paciente y de cita de una reserva externa"""
+        if not isinstance(booking, dict):
+            raise UserError(_('Cada reserva debe ser un objeto con sus campos.'))
+        missing = [
+            field for field in ('identification_id', 'patient_name', 'doctor_id', 'specialty_id', 'appointment_datetime')
+            if not booking.get(field)
+        ]
+        if missing:
+            raise UserError(_('Faltan campos obligatorios: %s') % ', '.join(missing))
+        
+        # Las integraciones pueden enviar la identificación como número
+        identification = str(booking['identification_id']).strip()
+        if not identification:
+            raise UserError(_('Faltan campos obligatorios: %s') % 'identification_id')
+        
+        patient_vals = {
+            'name': booking['patient_name'],
+            'identification_id': identification,
+            'phone': booking.get('phone'),
+            'email': booking.get('email'),
+        }
+        appointment_vals = {
+            'doctor_id': int(booking['doctor_id']),
+            'specialty_id': int(booking['specialty_id']),
+            'appointment_date': datetime.strptime(booking['appointment_datetime'], '%Y-%m-%d %H:%M:%S'),
+            'reason': booking.get('reason', ''),
+            'state': 'draft',
+        }
+        return patient_vals, appointment_vals
+    
     def action_confirm(self):
-        """Confirma la cita"""
-        for record in self:
-            if record.state != 'draft':
-                raise UserError(_('Solo se pueden confirmar citas en estado borrador.'))
-            
-            # Verificar disponibilidad del doctor
-            record._check_doctor_availability()
-            
-            record.write({
-                'state': 'confirmed',
-                'confirmation_date': datetime.now()
-            })
-            
-            # Crear evento en calendario
-            record._create_calendar_event()
-            
-            # Enviar notificación
-            record._send_confirmation_email()
+        """Confirma las citas en lote"""
+        if any(record.state != 'draft' for record in self):
+            raise UserError(_('Solo se pueden confirmar citas en estado borrador.'))
+        
+        # La restricción de exclusión de la base de datos verifica la
+        # disponibilidad de los doctores, incluidos los solapamientos del lote;
+        # si no existe, write la verifica en Python
+        self.write({
+            'state': 'confirmed',
+            'confirmation_date': datetime.now()
+        })
+        
+        # Crear eventos en calendario
+        self._create_calendar_events()
+        
+        # Enviar notificaciones
+        self._send_confirmation_email()
     
     def action_start(self):
         """Inicia la cita"""
@@ -204,63 +464,132 @@ class HospitalAppointment(models.Model):
         }
     
     def _check_doctor_availability(self):
-        """Verifica disponibilidad del doctor"""
-        self.ensure_one()
+        """Verifica disponibilidad de los doctores
+        
+        Carga en una sola consulta las citas confirmadas o en progreso de los
+        doctores en la ventana de las citas a verificar y busca en memoria
+        solapamientos, incluidos los que se dan entre las propias citas.
+        """
+        if not self:
+            return
         
-        # Buscar citas que se solapen
-        overlapping = self.env['hospital.appointment'].search([
-            ('doctor_id', '=', self.doctor_id.id),
-            ('id', '!=', self.id),
+        intervals = {
+            record.id: (record.appointment_date, record.appointment_date + timedelta(hours=record.duration))
+            for record in self
+        }
+        # La duración máxima de una cita es de 8 horas
+        existing = self.search([
+            ('doctor_id', 'in', self.doctor_id.ids),
+            ('id', 'not in', self.ids),
             ('state', 'in', ['confirmed', 'in_progress']),
-            ('appointment_date', '<', self.appointment_date + timedelta(hours=self.duration)),
-            ('appointment_date', '>', self.appointment_date - timedelta(hours=1)),
+            ('appointment_date', '<', max(stop for start, stop in intervals.values())),
+            ('appointment_date', '>', min(start for start, stop in intervals.values()) - timedelta(hours=8)),
         ])
+        for record in existing:
+            intervals[record.id] = (record.appointment_date, record.appointment_date + timedelta(hours=record.duration))
         
-        if overlapping:
-            raise ValidationError(
-                _('El doctor ya tiene una cita programada en este horario.')
-            )
+        checked_ids = set(self.ids)
+        by_doctor = defaultdict(list)
+        for record in self | existing:
+            start, stop = intervals[record.id]
+            by_doctor[record.doctor_id.id].append((start, stop, record.id in checked_ids))
+        
+        for doctor_intervals in by_doctor.values():
+            # Al recorrer por inicio, una cita se solapa con alguna anterior si
+            # empieza antes del mayor fin visto hasta ese momento
+            max_stop_any = max_stop_checked = datetime.min
+            for start, stop, checked in sorted(doctor_intervals):
+                if start < max_stop_checked or (checked and start < max_stop_any):
+                    raise ValidationError(
+                        _('El doctor ya tiene una cita programada en este horario.')
+                    )
+                max_stop_any = max(max_stop_any, stop)
+                if checked:
+                    max_stop_checked = max(max_stop_checked, stop)
     
-    def _create_calendar_event(self):
-        """Crea un evento en el calendario"""
+    def _prepare_calendar_event_values(self):
+        """Valores del evento de calendario de la cita"""
         self.ensure_one()
-        
-        if self.calendar_event_id:
-            return
-        
-        event = self.env['calendar.event'].create({
+        return {
             'name': f"Cita: {self.patient_id.name} - {self.doctor_id.name}",
             'start': self.appointment_date,
             'stop': self.appointment_date + timedelta(hours=self.duration),
             'description': self.reason or '',
             'location': self.doctor_id.consultation_room or '',
             'partner_ids': [(6, 0, [self.doctor_id.employee_id.user_id.partner_id.id])] if self.doctor_id.employee_id and self.doctor_id.employee_id.user_id else [],
-        })
+        }
+    
+    def _create_calendar_events(self):
+        """Crea los eventos en el calendario en una sola operación"""
+        records = self.filtered(lambda record: not record.calendar_event_id)
+        if not records:
+            return
+        
+        events = self.env['calendar.event'].create([
+            record._prepare_calendar_event_values() for record in records
+        ])
         
-        self.calendar_event_id = event.id
+        for record, event in zip(records, events):
+            record.calendar_event_id = event.id
     
-    def _update_calendar_event(self):
-        """Actualiza el evento de calendario"""
-        self.ensure_one()
+    def _schedule_calendar_sync(self, field_names):
+        """Sincroniza los eventos de calendario tras modificar los campos indicados
         
-        if not self.calendar_event_id:
+        Con el contexto defer_calendar_sync la sincronización se acumula y se
+        ejecuta una sola vez antes del commit, útil en ediciones masivas que
+        modifican las mismas citas varias veces. Un cr.flush() o un savepoint
+        con flush también ejecutan los hooks precommit y adelantan la
+        sincronización; write no los usa.
+        """
+        if not self.env.context.get('defer_calendar_sync'):
+            self._update_calendar_events(field_names)
             return
         
-        self.calendar_event_id.write({
-            'name': f"Cita: {self.patient_id.name} - {self.doctor_id.name}",
-            'start': self.appointment_date,
-            'stop': self.appointment_date + timedelta(hours=self.duration),
-            'description': self.reason or '',
-            'location': self.doctor_id.consultation_room or '',
-        })
+        data = self.env.cr.precommit.data
+        pending = data.get('hospital.appointment.calendar_sync')
+        if pending is None:
+            pending = data['hospital.appointment.calendar_sync'] = defaultdict(set)
+            self.env.cr.precommit.add(self.browse()._flush_calendar_sync)
+        for record in self:
+            pending[record.id].update(field_names)
     
-    def _send_confirmation_email(self):
-        """Envía email de confirmación"""
-        self.ensure_one()
+    def _flush_calendar_sync(self):
+        """Ejecuta la sincronización de calendario diferida de la transacción"""
+        pending = self.env.cr.precommit.data.pop('hospital.appointment.calendar_sync', {})
+        ids_by_fields = defaultdict(list)
+        for appointment_id, field_names in pending.items():
+            ids_by_fields[frozenset(field_names)].append(appointment_id)
+        for field_names, appointment_ids in ids_by_fields.items():
+            self.browse(appointment_ids).exists()._update_calendar_events(field_names)
+        # Los hooks precommit se ejecutan después del flush del commit
+        self.env.flush_all()
+    
+    def _update_calendar_events(self, field_names):
+        """Actualiza en lote los eventos de calendario de las citas confirmadas
+        
+        Solo escribe los campos del evento que dependen de los campos de la
+        cita modificados, con una escritura por grupo de eventos que reciben
+        los mismos valores.
+        """
+        event_fields = {name for field_name in field_names for name in CALENDAR_EVENT_FIELDS.get(field_name, ())}
+        records = self.filtered(lambda record: record.state == 'confirmed' and record.calendar_event_id)
+        if not event_fields or not records:
+            return
         
-        template = self.env.ref('citas_hospital.mail_template_appointment_confirmation', raise_if_not_found=False)
-        if template:
-            template.send_mail(self.id, force_send=True)
+        event_ids_by_values = defaultdict(list)
+        for record in records:
+            values = record._prepare_calendar_event_values()
+            key = tuple(sorted((name, values[name]) for name in event_fields))
+            event_ids_by_values[key].append(record.calendar_event_id.id)
+        
+        for values, event_ids in event_ids_by_values.items():
+            self.env['calendar.event'].browse(event_ids).write(dict(values))
+    
+    def _send_confirmation_email(self):
+        """Encola el email de confirmación para enviarlo tras el commit"""
+        self.env['hospital.notification']._enqueue(
+            'citas_hospital.mail_template_appointment_confirmation', self
+        )
     
     @api.constrains('appointment_date')
     def _check_appointment_date(self):
@@ -293,56 +622,119 @@ class HospitalAppointment(models.Model):
                     _('La duración no puede exceder 8 horas.')
                 )
     
-    @api.model
-    def _cron_send_reminders_24h(self):
-        """Cron: Envía recordatorios 24 horas antes"""
-        tomorrow = datetime.now() + timedelta(days=1)
-        appointments = self.search([
-            ('state', '=', 'confirmed'),
-            ('appointment_date', '>=', tomorrow),
-            ('appointment_date', '<=', tomorrow + timedelta(hours=1)),
-        ])
+    def _schedule_doctor_activities(self):
+        """Crea en lote una actividad por cita para el usuario de su doctor
+        
+        Omite las citas cuyo doctor no tiene usuario y las que ya tienen la
+        actividad asignada a ese usuario.
+        """
+        activity_type = self.env.ref('mail.mail_activity_data_todo', raise_if_not_found=False)
+        if not activity_type or not self:
+            return
+        
+        users_by_doctor = {
+            doctor.id: doctor.employee_id.user_id.id
+            for doctor in self.doctor_id
+            if doctor.employee_id.user_id
+        }
+        existing = {
+            (activity['res_id'], activity['user_id'][0])
+            for activity in self.env['mail.activity'].search_read([
+                ('res_model', '=', self._name),
+                ('res_id', 'in', self.ids),
+                ('activity_type_id', '=', activity_type.id),
+            ], ['res_id', 'user_id'])
+            if activity['user_id']
+        }
+        model_id = self.env['ir.model']._get_id(self._name)
         
-        template = self.env.ref('citas_hospital.mail_template_appointment_reminder_24h', raise_if_not_found=False)
-        for appointment in appointments:
-            if template:
-                template.send_mail(appointment.id, force_send=True)
+        vals_list = []
+        for appointment in self:
+            user_id = users_by_doctor.get(appointment.doctor_id.id)
+            if not user_id or (appointment.id, user_id) in existing:
+                continue
+            vals_list.append({
+                'res_model_id': model_id,
+                'res_id': appointment.id,
+                'activity_type_id': activity_type.id,
+                'summary': activity_type.summary,
+                'automated': True,
+                'user_id': user_id,
+                'note': f'Cita en 30 minutos con {appointment.patient_id.name}',
+                'date_deadline': appointment.appointment_date.date(),
+            })
+        self.env['mail.activity'].create(vals_list)
     
     @api.model
-    def _cron_send_reminders_2h(self):
-        """Cron: Envía recordatorios 2 horas antes"""
-        in_2h = datetime.now() + timedelta(hours=2)
-        appointments = self.search([
+    def _cron_send_reminders_24h(self, shard=0, shards=1):
+        """Cron: Envía recordatorios 24 horas antes
+        
+        Envía el recordatorio a las citas confirmadas de las próximas 24
+        horas que aún no lo recibieron. Las citas a menos de 2 horas solo
+        reciben el recordatorio de 2 horas, y las confirmadas con menos de 24
+        horas de anticipación no lo reciben: acaban de recibir el email de
+        confirmación.
+        """
+        now = datetime.now()
+        
+        def send(appointments):
+            due = appointments.filtered(
+                lambda record: not record.confirmation_date
+                or record.appointment_date - record.confirmation_date >= timedelta(days=1)
+            )
+            self.env['hospital.notification']._enqueue(
+                'citas_hospital.mail_template_appointment_reminder_24h', due
+            )
+            appointments.write({'reminder_24h_sent': True})
+        
+        self._run_cron('_cron_send_reminders_24h', [
             ('state', '=', 'confirmed'),
-            ('appointment_date', '>=', in_2h),
-            ('appointment_date', '<=', in_2h + timedelta(minutes=30)),
-        ])
+            ('appointment_date', '>', now + timedelta(hours=2)),
+            ('appointment_date', '<=', now + timedelta(days=1)),
+            ('reminder_24h_sent', '=', False),
+        ], send, order='appointment_date, id', shard=shard, shards=shards)
+    
+    @api.model
+    def _cron_send_reminders_2h(self, shard=0, shards=1):
+        """Cron: Envía recordatorios 2 horas antes
         
-        template = self.env.ref('citas_hospital.mail_template_appointment_reminder_2h', raise_if_not_found=False)
-        for appointment in appointments:
-            if template:
-                template.send_mail(appointment.id, force_send=True)
-            
+        Envía el recordatorio a las citas confirmadas de las próximas 2
+        horas que aún no lo recibieron y crea la actividad para el doctor.
+        """
+        now = datetime.now()
+        
+        def send(appointments):
+            self.env['hospital.notification']._enqueue(
+                'citas_hospital.mail_template_appointment_reminder_2h', appointments
+            )
             # Crear actividad para el doctor
-            if appointment.doctor_id.employee_id and appointment.doctor_id.employee_id.user_id:
-                appointment.activity_schedule(
-                    'mail.mail_activity_data_todo',
-                    user_id=appointment.doctor_id.employee_id.user_id.id,
-                    note=f'Cita en 30 minutos con {appointment.patient_id.name}',
-                    date_deadline=appointment.appointment_date.date(),
-                )
+            appointments._schedule_doctor_activities()
+            appointments.write({'reminder_2h_sent': True})
+        
+        self._run_cron('_cron_send_reminders_2h', [
+            ('state', '=', 'confirmed'),
+            ('appointment_date', '>', now),
+            ('appointment_date', '<=', now + timedelta(hours=2)),
+            ('reminder_2h_sent', '=', False),
+        ], send, order='appointment_date, id', shard=shard, shards=shards)
     
     @api.model
-    def _cron_auto_cancel_unconfirmed(self):
-        """Cron: Cancela citas no confirmadas 1 hora antes"""
+    def _cron_auto_cancel_unconfirmed(self, shard=0, shards=1):
+        """Cron: Cancela citas no confirmadas 1 hora antes
+        
+        Cancela cada bloque con una sola escritura en modo masivo, que
+        registra el lote en la auditoría en lugar del chatter de cada cita.
+        """
         in_1h = datetime.now() + timedelta(hours=1)
-        appointments = self.search([
-            ('state', '=', 'draft'),
-            ('appointment_date', '<=', in_1h),
-        ])
+        reason = 'Cancelada automáticamente por falta de confirmación.'
         
-        for appointment in appointments:
-            appointment.write({
+        def cancel(appointments):
+            appointments.with_context(hospital_bulk=True).write({
                 'state': 'cancelled',
-                'cancellation_reason': 'Cancelada automáticamente por falta de confirmación.'
+                'cancellation_reason': reason,
             })
+        
+        self._run_cron('_cron_auto_cancel_unconfirmed', [
+            ('state', '=', 'draft'),
+            ('appointment_date', '<=', in_1h),
+        ], cancel, order='appointment_date, id', shard=shard, shards=shards)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+
+
+class HospitalAuditLog(models.Model):
+    """Auditoría compacta de las operaciones realizadas en modo masivo"""
+    _name = 'hospital.audit.log'
+    _description = 'Auditoría de Operaciones Masivas'
+    _order = 'id desc'
+    
+    res_model = fields.Char(
+        string='Modelo',
+        required=True,
+        index=True
+    )
+    operation = fields.Selection([
+        ('create', 'Creación'),
+        ('write', 'Modificación'),
+    ], string='Operación', required=True)
+    res_ids = fields.Text(
+        string='IDs de Registros',
+        help='Lista JSON de los registros del lote'
+    )
+    record_count = fields.Integer(
+        string='Registros'
+    )
+    field_names = fields.Char(
+        string='Campos Modificados'
+    )
+    old_hash = fields.Char(
+        string='Hash Anterior',
+        help='SHA-256 de los valores de los campos antes de la operación'
+    )
+    new_hash = fields.Char(
+        string='Hash Nuevo',
+        help='SHA-256 de los valores de los campos después de la operación'
+    )
+    user_id = fields.Many2one(
+        'res.users',
+        string='Usuario',
+        default=lambda self: self.env.user,
+        readonly=True
+    )
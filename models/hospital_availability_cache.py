@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.tools import sql
+from odoo.tools.lru import LRU
+from collections import defaultdict
+from functools import partial
+import threading
+import time
+
+# Entradas (doctor, fecha) que guarda cada worker por base de datos
+CACHE_SIZE = 4096
+# Segundos de vida de una entrada
+CACHE_TTL = 300
+
+_lock = threading.RLock()
+# {dbname: LRU((doctor_id, época, fecha) -> (instante, slots))}
+_caches = {}
+# {dbname: xmin del snapshot de la última lectura de invalidaciones}. Toda
+# invalidación que esa lectura no vio pertenece a una transacción con id
+# mayor o igual, aunque su id de fila sea menor que el de las ya leídas.
+_xmins = {}
+# {dbname: {id de invalidación: id de transacción}} aplicadas con transacción
+# posterior al xmin, para no volver a aplicarlas al releerlas
+_applied = defaultdict(dict)
+# {dbname: número de invalidaciones aplicadas por este worker}
+_sequences = defaultdict(int)
+# {dbname: {doctor_id: época}}, permite invalidar todos los días de un doctor
+_doctor_epochs = defaultdict(dict)
+# {dbname: {(doctor_id, fecha): (número de invalidación, instante)}} aplicadas
+# durante el último CACHE_TTL, para descartar entradas calculadas antes
+_recent_invalidations = defaultdict(dict)
+
+
+class HospitalAvailabilityInvalidation(models.Model):
+    """Registro de invalidaciones de la caché de disponibilidad
+    
+    Cada worker guarda en memoria los slots calculados por (doctor, fecha).
+    Los cambios en citas y horarios insertan aquí una fila y los workers
+    leen las filas nuevas antes de consultar su caché, descartando solo las
+    entradas afectadas.
+    
+    Los ids de fila se asignan al insertar y no al confirmar, por lo que una
+    invalidación con id menor puede confirmarse después. Cada fila guarda el
+    id de su transacción y los workers releen las filas de las transacciones
+    que aún podían estar en curso en su lectura anterior.
+    """
+    _name = 'hospital.availability.invalidation'
+    _description = 'Invalidación de Disponibilidad'
+    _order = 'id'
+    
+    doctor_id = fields.Many2one(
+        'hospital.doctor',
+        string='Doctor',
+        required=True,
+        ondelete='cascade'
+    )
+    day = fields.Date(
+        string='Fecha',
+        help='Vacío para invalidar todos los días del doctor'
+    )
+    
+    def init(self):
+        """Agrega la columna con el id de la transacción que insertó cada fila"""
+        cr = self.env.cr
+        if not sql.column_exists(cr, self._table, 'xact_id'):
+            cr.execute("""
+                ALTER TABLE hospital_availability_invalidation
+                ADD COLUMN xact_id bigint NOT NULL DEFAULT txid_current()
+            """)
+        sql.create_index(cr, 'hospital_availability_invalidation_xact_id_index', self._table, ['xact_id'])
+    
+    @api.model
+    def _invalidate(self, slot_keys):
+        """Invalida en todos los workers los pares (doctor_id, fecha) indicados"""
+        if slot_keys:
+            self.create([
+                {'doctor_id': doctor_id, 'day': day}
+                for doctor_id, day in slot_keys
+            ])
+    
+    @api.model
+    def _invalidate_doctors(self, doctor_ids):
+        """Invalida en todos los workers todos los días de los doctores"""
+        if doctor_ids:
+            self.create([{'doctor_id': doctor_id} for doctor_id in doctor_ids])
+    
+    @api.model
+    def _get_cached(self, slot_keys):
+        """Devuelve las entradas vigentes en caché y el estado de la caché al leerlas
+        
+        Devuelve ({(doctor_id, fecha): slots}, snapshot). El snapshot se pasa
+        a _set_cached con los slots calculados para las entradas faltantes.
+        """
+        self._apply_invalidations()
+        dbname = self.env.cr.dbname
+        now = time.monotonic()
+        found = {}
+        with _lock:
+            epochs = _doctor_epochs[dbname]
+            snapshot = (now, _sequences[dbname], {
+                doctor_id: epochs.get(doctor_id, 0) for doctor_id, day in slot_keys
+            })
+            cache = _caches.get(dbname)
+            if cache is None:
+                return found, snapshot
+            for doctor_id, day in slot_keys:
+                entry = cache.get((doctor_id, epochs.get(doctor_id, 0), day))
+                if entry and now - entry[0] < CACHE_TTL:
+                    found[doctor_id, day] = entry[1]
+        return found, snapshot
+    
+    @api.model
+    def _set_cached(self, values, snapshot):
+        """Guarda {(doctor_id, fecha): slots} al confirmar la transacción
+        
+        Se espera al commit para no guardar datos que luego se revierten. Las
+        entradas invalidadas después del snapshot de _get_cached se descartan.
+        """
+        self.env.cr.postcommit.add(partial(_store_entries, self.env.cr.dbname, values, snapshot))
+    
+    @api.model
+    def _apply_invalidations(self):
+        """Descarta de la caché de este worker las entradas invalidadas por otros
+        
+        Lee las filas de las transacciones con id mayor o igual al xmin de la
+        lectura anterior: las transacciones anteriores al xmin ya terminaron y
+        sus filas se leyeron entonces. En la primera lectura la caché está
+        vacía y las filas solo se registran como aplicadas.
+        """
+        cr = self.env.cr
+        dbname = cr.dbname
+        cr.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        xmin = cr.fetchone()[0]
+        with _lock:
+            previous_xmin = _xmins.get(dbname, xmin)
+        
+        cr.execute("""
+            SELECT id, doctor_id, day, xact_id
+              FROM hospital_availability_invalidation
+             WHERE xact_id >= %s
+          ORDER BY id
+        """, [previous_xmin])
+        rows = cr.fetchall()
+        
+        now = time.monotonic()
+        with _lock:
+            cache = _caches.get(dbname)
+            epochs = _doctor_epochs[dbname]
+            recent = _recent_invalidations[dbname]
+            applied = _applied[dbname]
+            for invalidation_id, doctor_id, day, xact_id in rows:
+                if invalidation_id in applied:
+                    continue
+                applied[invalidation_id] = xact_id
+                _sequences[dbname] += 1
+                if not day:
+                    epochs[doctor_id] = epochs.get(doctor_id, 0) + 1
+                    continue
+                recent[doctor_id, day] = (_sequences[dbname], now)
+                if cache is not None:
+                    key = (doctor_id, epochs.get(doctor_id, 0), day)
+                    if key in cache:
+                        del cache[key]
+            for key in [key for key, (sequence, applied_at) in recent.items() if now - applied_at >= CACHE_TTL]:
+                del recent[key]
+            
+            # Otro hilo pudo leer con un snapshot más reciente
+            _xmins[dbname] = max(_xmins.get(dbname, xmin), xmin)
+            for invalidation_id in [key for key, xact_id in applied.items() if xact_id < _xmins[dbname]]:
+                del applied[invalidation_id]
+    
+    @api.autovacuum
+    def _gc_invalidations(self):
+        """Elimina las invalidaciones que ya no puede necesitar ningún worker"""
+        self.env.cr.execute("""
+            DELETE FROM hospital_availability_invalidation
+             WHERE create_date < (now() at time zone 'UTC') - interval '1 day'
+        """)
+
+
+def _store_entries(dbname, values, snapshot):
+    """Guarda {(doctor_id, fecha): slots} en la caché de disponibilidad de este worker
+    
+    snapshot es el estado devuelto por _get_cached antes de calcular los
+    slots. Se descartan las entradas cuyo doctor o fecha se invalidó desde
+    entonces, también desde otro hilo del mismo worker, y todas si el
+    snapshot es más antiguo que la vida de una entrada.
+    """
+    computed_at, sequence, epochs_at_read = snapshot
+    if time.monotonic() - computed_at >= CACHE_TTL:
+        return
+    with _lock:
+        cache = _caches.setdefault(dbname, LRU(CACHE_SIZE))
+        epochs = _doctor_epochs[dbname]
+        recent = _recent_invalidations[dbname]
+        for (doctor_id, day), slots in values.items():
+            epoch = epochs_at_read[doctor_id]
+            if epochs.get(doctor_id, 0) != epoch or recent.get((doctor_id, day), (0,))[0] > sequence:
+                continue
+            cache[doctor_id, epoch, day] = (computed_at, slots)
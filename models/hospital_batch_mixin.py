@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api
+from datetime import datetime
+import threading
+import time
+
+
+class HospitalBatchMixin(models.AbstractModel):
+    """Procesamiento por bloques de registros para los crons del hospital"""
+    _name = 'hospital.batch.mixin'
+    _description = 'Procesamiento por Bloques'
+    
+    @api.model
+    def _process_in_chunks(self, domain, callback, order='id'):
+        """Procesa por bloques los registros del dominio, confirmando tras cada bloque
+        
+        callback recibe cada bloque y debe dejar sus registros fuera del
+        dominio, de modo que una ejecución interrumpida continúa donde quedó.
+        El procesamiento se detiene al superar el tiempo límite; los registros
+        pendientes quedan para la siguiente ejecución del cron. Devuelve la
+        cantidad de registros procesados.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        chunk_size = int(params.get_param('citas_hospital.cron_chunk_size', 500))
+        time_limit = int(params.get_param('citas_hospital.cron_time_limit', 60))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        
+        processed = 0
+        deadline = time.monotonic() + time_limit
+        while time.monotonic() < deadline:
+            records = self.search(domain, order=order, limit=chunk_size)
+            if not records:
+                break
+            callback(records)
+            processed += len(records)
+            if auto_commit:
+                self.env.cr.commit()
+        return processed
+    
+    @api.model
+    def _shard_domain(self, shard, shards):
+        """Dominio de los registros cuyo doctor pertenece a la partición shard de shards
+        
+        Los doctores se reparten por id módulo shards, de modo que varios
+        crons con distinta partición procesan registros disjuntos.
+        """
+        if shards <= 1:
+            return []
+        if not 0 <= shard < shards:
+            raise ValueError("shard debe estar entre 0 y %s" % (shards - 1))
+        self.env.cr.execute("SELECT id FROM hospital_doctor WHERE id %% %s = %s", [shards, shard])
+        return [('doctor_id', 'in', [row[0] for row in self.env.cr.fetchall()])]
+    
+    @api.model
+    def _run_cron(self, name, domain, callback, order='id', shard=0, shards=1):
+        """Procesa por bloques una partición del dominio y registra su duración"""
+        date_start = datetime.now()
+        start = time.monotonic()
+        processed = self._process_in_chunks(domain + self._shard_domain(shard, shards), callback, order=order)
+        self.env['hospital.cron.run'].sudo().create({
+            'name': name,
+            'shard': shard,
+            'shards': shards,
+            'date_start': date_start,
+            'duration': time.monotonic() - start,
+            'record_count': processed,
+        })
+        return processed
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api
+import hashlib
+import json
+
+
+class HospitalBulkMixin(models.AbstractModel):
+    """Modo masivo para importaciones, crons y actualizaciones en lote
+    
+    Con el contexto hospital_bulk las creaciones y escrituras no generan
+    mensajes ni seguimiento en el chatter de cada registro; en su lugar se
+    guarda una fila de auditoría por lote en hospital.audit.log.
+    
+    Hereda de mail.thread y debe figurar primero en _inherit para ejecutarse
+    antes que su seguimiento.
+    """
+    _name = 'hospital.bulk.mixin'
+    _description = 'Modo Masivo'
+    _inherit = ['mail.thread']
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Crea sin seguimiento y registra el lote en la auditoría en modo masivo"""
+        if not self.env.context.get('hospital_bulk'):
+            return super(HospitalBulkMixin, self).create(vals_list)
+        
+        records = super(HospitalBulkMixin, self.with_context(tracking_disable=True)).create(vals_list)
+        field_names = sorted({name for vals in vals_list for name in vals if name in self._fields})
+        records._log_bulk_operation('create', field_names, False)
+        return records.with_env(self.env)
+    
+    def write(self, vals):
+        """Escribe sin seguimiento y registra el lote en la auditoría en modo masivo"""
+        if not self.env.context.get('hospital_bulk') or not self:
+            return super(HospitalBulkMixin, self).write(vals)
+        
+        field_names = sorted(name for name in vals if name in self._fields)
+        old_hash = self._bulk_hash(field_names)
+        result = super(HospitalBulkMixin, self.with_context(tracking_disable=True)).write(vals)
+        self._log_bulk_operation('write', field_names, old_hash)
+        return result
+    
+    def _bulk_hash(self, field_names):
+        """Hash de los valores de los campos indicados en los registros"""
+        values = self.sudo().read(field_names, load=None) if field_names else []
+        payload = json.dumps(values, default=str, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _log_bulk_operation(self, operation, field_names, old_hash):
+        """Registra una fila de auditoría para el lote"""
+        self.env['hospital.audit.log'].sudo().create({
+            'res_model': self._name,
+            'operation': operation,
+            'res_ids': json.dumps(self.ids),
+            'record_count': len(self),
+            'field_names': ','.join(field_names),
+            'old_hash': old_hash,
+            'new_hash': self._bulk_hash(field_names),
+        })
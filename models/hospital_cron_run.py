@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+
+
+class HospitalCronRun(models.Model):
+    """Duración de cada ejecución de los crons del hospital por partición"""
+    _name = 'hospital.cron.run'
+    _description = 'Ejecución de Cron'
+    _order = 'date_start desc, id desc'
+    
+    name = fields.Char(
+        string='Cron',
+        required=True,
+        index=True
+    )
+    shard = fields.Integer(
+        string='Partición',
+        default=0
+    )
+    shards = fields.Integer(
+        string='Particiones',
+        default=1
+    )
+    date_start = fields.Datetime(
+        string='Inicio',
+        required=True
+    )
+    duration = fields.Float(
+        string='Duración (segundos)',
+        digits=(16, 3)
+    )
+    record_count = fields.Integer(
+        string='Registros Procesados'
+    )
+    
+    @api.autovacuum
+    def _gc_runs(self):
+        """Elimina las ejecuciones de más de 30 días"""
+        self.env.cr.execute("""
+            DELETE FROM hospital_cron_run
+             WHERE date_start < (now() at time zone 'UTC') - interval '30 days'
+        """)
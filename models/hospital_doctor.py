@@ -2,14 +2,16 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from .hospital_slot import is_slot_busy
 
 
 class HospitalDoctor(models.Model):
     """Modelo para gestionar doctores del hospital"""
     _name = 'hospital.doctor'
     _description = 'Doctor del Hospital'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['hospital.bulk.mixin', 'mail.thread', 'mail.activity.mixin']
     _order = 'name'
     
     # Campos básicos
@@ -107,28 +109,38 @@ class HospitalDoctor(models.Model):
     def _compute_appointment_today_count(self):
         """Cuenta las citas del doctor para hoy"""
         today = datetime.now().date()
+        counts = self._count_by_doctor('hospital.appointment', [
+            ('appointment_date', '>=', today),
+            ('appointment_date', '<', today + timedelta(days=1)),
+            ('state', 'in', ['confirmed', 'in_progress'])
+        ])
         for record in self:
-            record.appointment_today_count = self.env['hospital.appointment'].search_count([
-                ('doctor_id', '=', record.id),
-                ('appointment_date', '>=', today),
-                ('appointment_date', '<', today + timedelta(days=1)),
-                ('state', 'in', ['confirmed', 'in_progress'])
-            ])
+            record.appointment_today_count = counts.get(record.id, 0)
     
     @api.depends('appointment_ids')
     def _compute_appointment_pending_count(self):
         """Cuenta las citas pendientes de confirmación"""
+        counts = self._count_by_doctor('hospital.appointment', [('state', '=', 'draft')])
         for record in self:
-            record.appointment_pending_count = self.env['hospital.appointment'].search_count([
-                ('doctor_id', '=', record.id),
-                ('state', '=', 'draft')
-            ])
+            record.appointment_pending_count = counts.get(record.id, 0)
     
     @api.depends('prescription_ids')
     def _compute_prescription_count(self):
         """Cuenta el total de recetas emitidas"""
+        counts = self._count_by_doctor('hospital.prescription', [])
         for record in self:
-            record.prescription_count = len(record.prescription_ids)
+            record.prescription_count = counts.get(record.id, 0)
+    
+    def _count_by_doctor(self, model, domain):
+        """Cuenta en una sola consulta agrupada los registros de cada doctor"""
+        if not self.ids:
+            return {}
+        return {
+            doctor.id: count
+            for doctor, count in self.env[model]._read_group(
+                [('doctor_id', 'in', self.ids)] + domain, ['doctor_id'], ['__count']
+            )
+        }
     
     def action_view_appointments_today(self):
         """Acción para ver las citas de hoy"""
@@ -174,6 +186,142 @@ class HospitalDoctor(models.Model):
             'context': {'default_doctor_id': self.id},
         }
     
+    def _get_available_slots(self, day):
+        """Calcula los slots libres del doctor para una fecha"""
+        self.ensure_one()
+        return self._get_availability(day, day)[self.id].get(day, [])
+    
+    def _get_availability(self, date_from, date_to):
+        """Calcula los slots libres de los doctores en un rango de fechas
+        
+        Los pares (doctor, fecha) ya calculados se sirven desde la caché del
+        worker y el resto se calcula en una sola pasada. Los slots retenidos
+        por un hold vigente se excluyen. Devuelve {doctor_id: {fecha:
+        [slots]}}.
+        """
+        Cache = self.env['hospital.availability.invalidation'].sudo()
+        days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+        slot_keys = [(doctor.id, day) for doctor in self for day in days]
+        
+        starts_by_key, snapshot = Cache._get_cached(slot_keys)
+        missing = [key for key in slot_keys if key not in starts_by_key]
+        if missing:
+            missing_days = [day for doctor_id, day in missing]
+            doctors = self.browse(list({doctor_id for doctor_id, day in missing}))
+            computed = doctors._compute_availability(min(missing_days), max(missing_days))
+            values = {
+                (doctor_id, day): computed[doctor_id].get(day, [])
+                for doctor_id, day in missing
+            }
+            Cache._set_cached(values, snapshot)
+            starts_by_key.update(values)
+        
+        # Los slots con un hold vigente no se ofrecen
+        held = self.env['hospital.slot.hold'].sudo()._get_held_starts(self.ids, date_from, date_to)
+        now = datetime.now()
+        result = {doctor.id: {} for doctor in self}
+        for doctor_id, day in slot_keys:
+            result[doctor_id][day] = [
+                self._format_slot(start)
+                for start in starts_by_key[doctor_id, day]
+                if start > now and (doctor_id, start) not in held
+            ]
+        return result
+    
+    def _iter_available_slots(self, date_from, date_to, first_chunk=None, chunk_days=7):
+        """Genera en orden cronológico los slots libres del doctor
+        
+        La disponibilidad se calcula por bloques de chunk_days días a medida
+        que se consume el generador. first_chunk permite pasar el primer
+        bloque ya calculado ({fecha: [slots]}). Produce tuplas
+        (datetime, doctor_id, slot).
+        """
+        self.ensure_one()
+        chunk_from = date_from
+        while chunk_from <= date_to:
+            chunk_to = min(chunk_from + timedelta(days=chunk_days - 1), date_to)
+            if first_chunk is not None:
+                days = first_chunk
+                first_chunk = None
+            else:
+                days = self._get_availability(chunk_from, chunk_to)[self.id]
+            for day in sorted(days):
+                for slot in days[day]:
+                    yield slot['datetime'], self.id, slot
+            chunk_from = chunk_to + timedelta(days=1)
+    
+    def _compute_availability(self, date_from, date_to):
+        """Calcula los inicios de los slots libres en un rango de fechas
+        
+        Si el rango está dentro de los slots materializados se resuelve con
+        una sola búsqueda sobre hospital.slot. Si no, los horarios y las citas
+        que bloquean el rango se cargan en una consulta cada uno y se cruzan
+        en memoria con los slots generados. Devuelve {doctor_id: {fecha:
+        [inicios]}} sin filtrar los slots ya pasados.
+        """
+        horizon = self.env['hospital.slot']._get_horizon()
+        if horizon and date_to <= horizon:
+            return self._compute_availability_from_slots(date_from, date_to)
+        
+        schedules_by_day = defaultdict(lambda: self.env['hospital.schedule'])
+        for schedule in self.env['hospital.schedule'].search([
+            ('doctor_id', 'in', self.ids),
+            ('active', '=', True)
+        ]):
+            schedules_by_day[schedule.day_of_week] |= schedule
+        
+        intervals = defaultdict(list)
+        day = date_from
+        while day <= date_to:
+            for schedule in schedules_by_day[str(day.weekday())]:
+                intervals[schedule.doctor_id.id, day] += schedule._get_slot_intervals(day)
+            day += timedelta(days=1)
+        
+        result = {doctor.id: {} for doctor in self}
+        if not intervals:
+            return result
+        
+        all_intervals = [interval for day_intervals in intervals.values() for interval in day_intervals]
+        busy = defaultdict(list)
+        for appointment in self.env['hospital.appointment'].search_read([
+            ('doctor_id', 'in', self.ids),
+            ('appointment_date', '>=', min(start for start, stop in all_intervals)),
+            ('appointment_date', '<', max(stop for start, stop in all_intervals)),
+            ('state', 'in', ['draft', 'confirmed', 'in_progress'])
+        ], ['doctor_id', 'appointment_date']):
+            busy[appointment['doctor_id'][0]].append(appointment['appointment_date'])
+        for starts in busy.values():
+            starts.sort()
+        
+        for (doctor_id, day), day_intervals in sorted(intervals.items()):
+            result[doctor_id][day] = [
+                slot_start
+                for slot_start, slot_stop in day_intervals
+                if not is_slot_busy(busy[doctor_id], slot_start, slot_stop)
+            ]
+        return result
+    
+    def _compute_availability_from_slots(self, date_from, date_to):
+        """Calcula la disponibilidad a partir de los slots materializados"""
+        result = {doctor.id: defaultdict(list) for doctor in self}
+        for slot in self.env['hospital.slot'].search_read([
+            ('doctor_id', 'in', self.ids),
+            ('start', '>=', datetime.combine(date_from, time.min)),
+            ('start', '<', datetime.combine(date_to + timedelta(days=1), time.min)),
+            ('state', '=', 'free'),
+        ], ['doctor_id', 'start'], order='start'):
+            result[slot['doctor_id'][0]][slot['start'].date()].append(slot['start'])
+        return {doctor_id: dict(days) for doctor_id, days in result.items()}
+    
+    @api.model
+    def _format_slot(self, slot_start):
+        """Formato JSON de un slot libre para el website"""
+        return {
+            'time': slot_start.strftime('%H:%M'),
+            'datetime': slot_start.strftime('%Y-%m-%d %H:%M:%S'),
+            'available': True
+        }
+    
     @api.constrains('years_experience')
     def _check_years_experience(self):
         """Valida los años de experiencia"""
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.tools import sql
+from collections import defaultdict
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class HospitalNotification(models.Model):
+    """Bandeja de salida de notificaciones a pacientes
+    
+    Las acciones de negocio registran aquí la notificación en la misma
+    transacción y un cron la envía después del commit, con reintentos, sin
+    que el usuario espere el renderizado ni la entrega.
+    
+    Cada notificación tiene un canal y un proveedor. El envío se delega en
+    el método _send_<proveedor>, de modo que un módulo puede agregar un
+    canal (por ejemplo SMS) extendiendo las selecciones y definiendo el
+    método de su proveedor.
+    """
+    _name = 'hospital.notification'
+    _description = 'Notificación al Paciente'
+    _order = 'id desc'
+    
+    template_id = fields.Many2one(
+        'mail.template',
+        string='Plantilla',
+        required=True,
+        ondelete='cascade'
+    )
+    res_model = fields.Char(
+        string='Modelo',
+        required=True
+    )
+    res_id = fields.Integer(
+        string='ID del Registro',
+        required=True
+    )
+    channel = fields.Selection([
+        ('email', 'Email'),
+    ], string='Canal', default='email', required=True)
+    provider = fields.Selection([
+        ('mail', 'Servidor de Correo'),
+        ('file', 'Archivo Local (pruebas)'),
+    ], string='Proveedor', default='mail', required=True)
+    state = fields.Selection([
+        ('pending', 'Pendiente'),
+        ('sent', 'Enviada'),
+        ('failed', 'Fallida'),
+    ], string='Estado', default='pending', required=True, index=True)
+    attempts = fields.Integer(
+        string='Intentos',
+        default=0,
+        readonly=True
+    )
+    next_attempt = fields.Datetime(
+        string='Próximo Intento',
+        default=fields.Datetime.now,
+        index=True
+    )
+    sent_date = fields.Datetime(
+        string='Fecha de Envío',
+        readonly=True
+    )
+    last_error = fields.Text(
+        string='Último Error',
+        readonly=True
+    )
+    
+    def init(self):
+        """Crea el índice usado por el despachador"""
+        sql.create_index(
+            self.env.cr, 'hospital_notification_pending_index', self._table,
+            ['next_attempt', 'id'], where="state = 'pending'"
+        )
+    
+    @api.model
+    def _get_provider(self, channel):
+        """Proveedor configurado para el canal"""
+        return self.env['ir.config_parameter'].sudo().get_param(
+            f'citas_hospital.notification_provider_{channel}', 'mail'
+        )
+    
+    @api.model
+    def _enqueue(self, template_xmlid, records, channel='email'):
+        """Registra una notificación por registro con la plantilla indicada
+        
+        El cron de envío se dispara al confirmar la transacción; si la
+        transacción se revierte, la notificación no se envía.
+        """
+        template = self.env.ref(template_xmlid, raise_if_not_found=False)
+        if not template or not records:
+            return self.browse()
+        
+        provider = self._get_provider(channel)
+        notifications = self.sudo().create([{
+            'template_id': template.id,
+            'res_model': records._name,
+            'res_id': record.id,
+            'channel': channel,
+            'provider': provider,
+        } for record in records])
+        self.env.ref('citas_hospital.cron_notification_dispatch').sudo()._trigger()
+        return notifications
+    
+    @api.model
+    def _claim_due(self, limit):
+        """Bloquea y devuelve hasta limit notificaciones pendientes vencidas
+        
+        Las filas bloqueadas por otro despachador se omiten, por lo que varios
+        despachadores pueden ejecutarse en paralelo sin enviar dos veces la
+        misma notificación.
+        """
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT id
+              FROM hospital_notification
+             WHERE state = 'pending'
+               AND next_attempt <= %s
+          ORDER BY next_attempt, id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [datetime.now(), limit])
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+    
+    @api.model
+    def _cron_dispatch(self):
+        """Cron: Envía por bloques las notificaciones pendientes cuyo intento ya venció"""
+        params = self.env['ir.config_parameter'].sudo()
+        chunk_size = int(params.get_param('citas_hospital.cron_chunk_size', 500))
+        time_limit = int(params.get_param('citas_hospital.cron_time_limit', 60))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        
+        deadline = time.monotonic() + time_limit
+        while time.monotonic() < deadline:
+            notifications = self._claim_due(chunk_size)
+            if not notifications:
+                break
+            notifications._dispatch()
+            if auto_commit:
+                # Libera los bloqueos del bloque
+                self.env.cr.commit()
+    
+    def _dispatch(self):
+        """Envía las notificaciones agrupadas por canal y proveedor y registra el resultado
+        
+        Las notificaciones cuyo registro fue eliminado se marcan como fallidas
+        sin enviarse, ya que impedirían renderizar todo su grupo. Cada grupo
+        usa su propio savepoint: si el proveedor falla por completo se
+        revierte solo ese grupo y sus notificaciones se reintentan.
+        """
+        missing = self._filter_missing_records()
+        missing.write({'state': 'failed', 'last_error': _('El registro no existe.')})
+        
+        groups = defaultdict(list)
+        for notification in self - missing:
+            groups[notification.channel, notification.provider].append(notification.id)
+        
+        errors = {}
+        for (channel, provider), notification_ids in groups.items():
+            notifications = self.browse(notification_ids)
+            try:
+                with self.env.cr.savepoint():
+                    errors.update(getattr(notifications, f'_send_{provider}')())
+            except Exception as e:
+                _logger.warning(
+                    "Error del proveedor %s al enviar notificaciones por %s: %s", provider, channel, e
+                )
+                errors.update(dict.fromkeys(notification_ids, str(e)))
+        
+        (self - missing)._register_result(errors)
+    
+    def _filter_missing_records(self):
+        """Notificaciones cuyo registro destino ya no existe"""
+        missing = self.browse()
+        for res_model, notifications in self.grouped('res_model').items():
+            existing_ids = set(self.env[res_model].browse(notifications.mapped('res_id')).exists().ids)
+            missing |= notifications.filtered(lambda notification: notification.res_id not in existing_ids)
+        return missing
+    
+    def _register_result(self, errors):
+        """Marca como enviadas las notificaciones sin error y reprograma las fallidas
+        
+        errors es {notification_id: mensaje}. Los reintentos usan espera
+        exponencial hasta el máximo de intentos configurado.
+        """
+        now = datetime.now()
+        sent = self.filtered(lambda n: n.id not in errors)
+        for attempts, notifications in sent.grouped('attempts').items():
+            notifications.write({
+                'attempts': attempts + 1,
+                'state': 'sent',
+                'sent_date': now,
+                'last_error': False,
+            })
+        
+        max_attempts = int(self.env['ir.config_parameter'].sudo().get_param(
+            'citas_hospital.notification_max_attempts', 5
+        ))
+        for notification in self - sent:
+            attempts = notification.attempts + 1
+            notification.write({
+                'attempts': attempts,
+                'last_error': errors[notification.id],
+                'state': 'failed' if attempts >= max_attempts else 'pending',
+                'next_attempt': now + timedelta(minutes=2 ** attempts),
+            })
+    
+    def _send_mail(self):
+        """Proveedor de email: renderiza por plantilla y envía con el servidor de correo
+        
+        Devuelve {notification_id: mensaje} con los envíos fallidos.
+        """
+        errors = {}
+        for template, notifications in self.grouped('template_id').items():
+            notifications_by_res = defaultdict(list)
+            for notification in notifications:
+                notifications_by_res[notification.res_id].append(notification.id)
+            
+            mails = template.send_mail_batch(list(notifications_by_res), force_send=False)
+            mails.send(auto_commit=False, raise_exception=False)
+            
+            failed = mails.exists().filtered(lambda mail: mail.state == 'exception')
+            for mail in failed:
+                error = mail.failure_reason or _('Error de envío')
+                errors.update(dict.fromkeys(notifications_by_res[mail.res_id], error))
+            # El reintento lo hace la bandeja de salida, no la cola de correo
+            failed.unlink()
+        return errors
+    
+    def _send_file(self):
+        """Proveedor de pruebas: agrega las notificaciones renderizadas a un archivo JSON Lines
+        
+        La ruta se configura con citas_hospital.notification_file_path.
+        """
+        path = self.env['ir.config_parameter'].sudo().get_param('citas_hospital.notification_file_path') or os.path.join(
+            tempfile.gettempdir(), f'hospital_notifications_{self.env.cr.dbname}.jsonl'
+        )
+        lines = []
+        for template, notifications in self.grouped('template_id').items():
+            res_ids = notifications.mapped('res_id')
+            recipients = template._render_field('email_to', res_ids)
+            subjects = template._render_field('subject', res_ids)
+            bodies = template._render_field('body_html', res_ids)
+            for notification in notifications:
+                lines.append(json.dumps({
+                    'id': notification.id,
+                    'channel': notification.channel,
+                    'template': template.name,
+                    'res_model': notification.res_model,
+                    'res_id': notification.res_id,
+                    'to': recipients.get(notification.res_id),
+                    'subject': subjects.get(notification.res_id),
+                    'body': bodies.get(notification.res_id),
+                }, default=str))
+        
+        with open(path, 'a', encoding='utf-8') as notification_file:
+            notification_file.write(''.join(f'{line}\n' for line in lines))
+        return {}
+    
+    def action_retry(self):
+        """Vuelve a programar las notificaciones fallidas"""
+        self.write({
+            'state': 'pending',
+            'attempts': 0,
+            'next_attempt': datetime.now(),
+        })
+        self.env.ref('citas_hospital.cron_notification_dispatch').sudo()._trigger()
+    
+    def name_get(self):
+        """Personaliza el nombre mostrado"""
+        result = []
+        for record in self:
+            name = f"{record.template_id.name} ({record.res_model},{record.res_id})"
+            result.append((record.id, name))
+        return result
@@ -1,16 +1,30 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
+from odoo.exceptions import ConcurrencyError, UserError, ValidationError
+from odoo.tools import ormcache, sql
 from datetime import date
 from dateutil.relativedelta import relativedelta
+from psycopg2 import errors as pg_errors
+import re
+
+# Restricciones que detectan un paciente ya creado por otra transacción
+IDENTIFICATION_CONSTRAINTS = (
+    'hospital_patient_identification_unique',
+    'hospital_patient_identification_normalized_unique',
+)
+
+
+def normalize_identification(identification):
+    """Identificación sin separadores ni espacios y en mayúsculas"""
+    return re.sub(r'[^0-9A-Za-z]', '', identification or '').upper()
 
 
 class HospitalPatient(models.Model):
     """Modelo para gestionar pacientes del hospital"""
     _name = 'hospital.patient'
     _description = 'Paciente del Hospital'
-    _inherit = ['mail.thread', 'mail.activity.mixin', 'portal.mixin']
+    _inherit = ['hospital.bulk.mixin', 'mail.thread', 'mail.activity.mixin', 'portal.mixin']
     _order = 'name'
     
     # Campos básicos
@@ -27,6 +41,12 @@ class HospitalPatient(models.Model):
         index=True,
         help='Documento de identidad único del paciente'
     )
+    identification_normalized = fields.Char(
+        string='DNI/Cédula Normalizado',
+        compute='_compute_identification_normalized',
+        store=True,
+        help='Identificación sin puntos, guiones ni espacios, única por paciente'
+    )
     birth_date = fields.Date(
         string='Fecha de Nacimiento',
         tracking=True
@@ -113,9 +133,18 @@ class HospitalPatient(models.Model):
     # Constraints SQL
     _sql_constraints = [
         ('identification_unique', 'UNIQUE(identification_id)',
-         'El número de identificación debe ser único!')
+         'El número de identificación debe ser único!'),
+        ('identification_normalized_unique', 'UNIQUE(identification_normalized)',
+         'Ya existe un paciente con el mismo número de identificación!')
     ]
     
+    @api.depends('identification_id')
+    def _compute_identification_normalized(self):
+        """Normaliza la identificación para detectar duplicados"""
+        for record in self:
+            # Vacío como NULL: las identificaciones sin dígitos ni letras no chocan
+            record.identification_normalized = normalize_identification(record.identification_id) or False
+    
     @api.depends('birth_date')
     def _compute_age(self):
         """Calcula la edad del paciente basado en su fecha de nacimiento"""
@@ -129,31 +158,123 @@ class HospitalPatient(models.Model):
     @api.depends('appointment_ids')
     def _compute_appointment_count(self):
         """Cuenta el total de citas del paciente"""
+        counts = self._count_by_patient('hospital.appointment')
         for record in self:
-            record.appointment_count = len(record.appointment_ids)
+            record.appointment_count = counts.get(record.id, 0)
     
     @api.depends('prescription_ids')
     def _compute_prescription_count(self):
         """Cuenta el total de recetas del paciente"""
+        counts = self._count_by_patient('hospital.prescription')
         for record in self:
-            record.prescription_count = len(record.prescription_ids)
+            record.prescription_count = counts.get(record.id, 0)
+    
+    def _count_by_patient(self, model):
+        """Cuenta en una sola consulta agrupada los registros de cada paciente"""
+        if not self.ids:
+            return {}
+        return {
+            patient.id: count
+            for patient, count in self.env[model]._read_group(
+                [('patient_id', 'in', self.ids)], ['patient_id'], ['__count']
+            )
+        }
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Crea automáticamente en lote los partners que no existen"""
+        result = super(HospitalPatient, self).create(vals_list)
+        result._create_partners()
+        return result
+    
+    def _create_partners(self):
+        """Crea en un solo create los partners de los pacientes con email sin partner"""
+        patients = self.filtered(lambda patient: not patient.partner_id and patient.email)
+        partners = self.env['res.partner'].create([{
+            'name': patient.name,
+            'email': patient.email,
+            'phone': patient.phone,
+            'street': patient.address,
+            'type': 'contact',
+        } for patient in patients])
+        for patient, partner in zip(patients, partners):
+            patient.partner_id = partner.id
     
     @api.model
-    def create(self, vals):
-        """Crea automáticamente un partner si no existe"""
-        result = super(HospitalPatient, self).create(vals)
+    def _resolve_patients(self, vals_list):
+        """Busca o crea pacientes por identificación normalizada en lote
         
-        if not result.partner_id and result.email:
-            partner = self.env['res.partner'].create({
-                'name': result.name,
-                'email': result.email,
-                'phone': result.phone,
-                'street': result.address,
-                'type': 'contact',
-            })
-            result.partner_id = partner.id
+        Devuelve {identification_id: paciente} con las identificaciones tal
+        como se recibieron. Los pacientes nuevos se crean con create en un
+        savepoint. Si una reserva simultánea creó el mismo paciente, la
+        restricción única lo detecta y se vuelve a buscar; si la transacción
+        concurrente aún no es visible se produce un ConcurrencyError y Odoo
+        reintenta la petición.
+        """
+        if not self._has_identification_constraint():
+            # Volver a comprobar en la próxima llamada, tras actualizar el módulo
+            self.env.registry.clear_cache()
+            raise UserError(_(
+                'Falta la restricción única de identificación normalizada de pacientes. '
+                'Corrija los pacientes duplicados y actualice el módulo.'
+            ))
         
-        return result
+        vals_by_key = {}
+        for vals in vals_list:
+            key = normalize_identification(vals['identification_id'])
+            if not key:
+                raise ValidationError(_('El número de identificación no es válido.'))
+            vals_by_key.setdefault(key, vals)
+        
+        patients = self._search_by_identification(list(vals_by_key))
+        missing = [key for key in vals_by_key if key not in patients]
+        if missing:
+            try:
+                self._create_ignore_conflicts([vals_by_key[key] for key in missing])
+            except pg_errors.UniqueViolation:
+                # Uno de los pacientes lo creó otra transacción: crear uno por uno
+                for key in missing:
+                    self._create_ignore_conflicts([vals_by_key[key]])
+            patients.update(self._search_by_identification(missing))
+            if any(key not in patients for key in missing):
+                raise ConcurrencyError(_('Otra reserva está creando el mismo paciente.'))
+        
+        return {
+            vals['identification_id']: patients[normalize_identification(vals['identification_id'])]
+            for vals in vals_list
+        }
+    
+    @api.model
+    def _create_ignore_conflicts(self, vals_list):
+        """Crea los pacientes en un savepoint e ignora el conflicto de un único paciente
+        
+        Un conflicto con la identificación de otro paciente de un lote de
+        varios se propaga para que el llamador cree los pacientes uno por uno.
+        """
+        try:
+            with self.env.cr.savepoint():
+                return self.create(vals_list)
+        except pg_errors.UniqueViolation as e:
+            if len(vals_list) > 1 or e.diag.constraint_name not in IDENTIFICATION_CONSTRAINTS:
+                raise
+            return self.browse()
+    
+    @api.model
+    def _search_by_identification(self, keys):
+        """Devuelve {identificación normalizada: paciente}, incluidos los archivados"""
+        return {
+            patient.identification_normalized: patient
+            for patient in self.with_context(active_test=False).search([
+                ('identification_normalized', 'in', keys)
+            ])
+        }
+    
+    @ormcache()
+    def _has_identification_constraint(self):
+        """Indica si la base de datos tiene la restricción única de identificación normalizada"""
+        return bool(sql.constraint_definition(
+            self.env.cr, self._table, 'hospital_patient_identification_normalized_unique'
+        ))
     
     def action_view_appointments(self):
         """Acción para abrir las citas del paciente"""
@@ -2,6 +2,7 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools import sql
 from datetime import date, timedelta
 
 
@@ -9,7 +10,7 @@ class HospitalPrescription(models.Model):
     """Modelo para gestionar recetas médicas"""
     _name = 'hospital.prescription'
     _description = 'Receta Médica'
-    _inherit = ['mail.thread', 'mail.activity.mixin', 'portal.mixin']
+    _inherit = ['hospital.bulk.mixin', 'mail.thread', 'mail.activity.mixin', 'portal.mixin', 'hospital.batch.mixin']
     _order = 'prescription_date desc'
     
     name = fields.Char(
@@ -90,6 +91,12 @@ class HospitalPrescription(models.Model):
          'El número de receta debe ser único!')
     ]
     
+    def init(self):
+        """Crea el índice usado por el cron de expiración"""
+        sql.create_index(
+            self.env.cr, 'hospital_prescription_state_expiry_index', self._table, ['state', 'expiry_date']
+        )
+    
     @api.depends('prescription_date', 'validity_days')
     def _compute_expiry_date(self):
         """Calcula la fecha de expiración"""
@@ -99,13 +106,15 @@ class HospitalPrescription(models.Model):
             else:
                 record.expiry_date = False
     
-    @api.model
-    def create(self, vals):
-        """Genera secuencia automática al crear"""
-        if vals.get('name', _('Nuevo')) == _('Nuevo'):
-            vals['name'] = self.env['ir.sequence'].next_by_code('hospital.prescription') or _('Nuevo')
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Genera las secuencias del lote al crear"""
+        new_vals = [vals for vals in vals_list if vals.get('name', _('Nuevo')) == _('Nuevo')]
+        names = self.env['ir.sequence']._next_by_code_batch('hospital.prescription', len(new_vals))
+        for vals, name in zip(new_vals, names):
+            vals['name'] = name or _('Nuevo')
         
-        return super(HospitalPrescription, self).create(vals)
+        return super(HospitalPrescription, self).create(vals_list)
     
     def action_issue(self):
         """Emite la receta"""
@@ -121,9 +130,9 @@ class HospitalPrescription(models.Model):
                 line._check_stock()
             
             record.state = 'issued'
-            
-            # Enviar notificación
-            record._send_issued_email()
+        
+        # Enviar notificación
+        self._send_issued_email()
     
     def action_dispense(self):
         """Marca la receta como dispensada"""
@@ -146,24 +155,27 @@ class HospitalPrescription(models.Model):
             )
     
     def _send_issued_email(self):
-        """Envía email al emitir la receta"""
-        self.ensure_one()
-        
-        template = self.env.ref('citas_hospital.mail_template_prescription_issued', raise_if_not_found=False)
-        if template:
-            template.send_mail(self.id, force_send=True)
+        """Encola el email de receta emitida para enviarlo tras el commit"""
+        self.env['hospital.notification']._enqueue(
+            'citas_hospital.mail_template_prescription_issued', self
+        )
     
     @api.model
-    def _cron_check_expiry(self):
-        """Cron: Marca recetas expiradas"""
+    def _cron_check_expiry(self, shard=0, shards=1):
+        """Cron: Marca recetas expiradas
+        
+        Expira cada bloque con una sola escritura en modo masivo, que
+        registra el lote en la auditoría en lugar del chatter de cada receta.
+        """
         today = date.today()
-        expired = self.search([
-            ('state', 'in', ['issued']),
-            ('expiry_date', '<', today),
-        ])
         
-        for prescription in expired:
-            prescription.state = 'expired'
+        def expire(prescriptions):
+            prescriptions.with_context(hospital_bulk=True).write({'state': 'expired'})
+        
+        self._run_cron('_cron_check_expiry', [
+            ('state', '=', 'issued'),
+            ('expiry_date', '<', today),
+        ], expire, order='expiry_date, id', shard=shard, shards=shards)
     
     @api.constrains('validity_days')
     def _check_validity_days(self):
@@ -2,6 +2,7 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from datetime import datetime, time, timedelta
 
 
 class HospitalSchedule(models.Model):
@@ -47,6 +48,36 @@ class HospitalSchedule(models.Model):
         default=True
     )
     
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Genera los slots de los nuevos horarios"""
+        records = super(HospitalSchedule, self).create(vals_list)
+        records._regenerate_slots(records.doctor_id)
+        return records
+    
+    def write(self, vals):
+        """Regenera los slots si cambian los datos del horario"""
+        doctors = self.doctor_id
+        result = super(HospitalSchedule, self).write(vals)
+        if set(vals) & {'doctor_id', 'day_of_week', 'hour_from', 'hour_to', 'slot_duration', 'active'}:
+            self._regenerate_slots(doctors | self.doctor_id)
+        return result
+    
+    def unlink(self):
+        """Regenera los slots de los doctores afectados"""
+        doctors = self.doctor_id
+        result = super(HospitalSchedule, self).unlink()
+        self._regenerate_slots(doctors)
+        return result
+    
+    def _regenerate_slots(self, doctors):
+        """Regenera los slots materializados de los doctores hasta el horizonte"""
+        Slot = self.env['hospital.slot'].sudo()
+        horizon = Slot._get_horizon()
+        if horizon:
+            Slot._generate_slots(doctors.sudo(), fields.Date.context_today(self), horizon)
+        self.env['hospital.availability.invalidation'].sudo()._invalidate_doctors(doctors.ids)
+    
     @api.constrains('hour_from', 'hour_to')
     def _check_hours(self):
         """Valida que las horas sean válidas"""
@@ -95,6 +126,20 @@ class HospitalSchedule(models.Model):
                     _('Este horario se solapa con otro horario existente del mismo doctor.')
                 )
     
+    def _get_slot_intervals(self, day):
+        """Genera los intervalos (inicio, fin) de los slots del horario para una fecha"""
+        self.ensure_one()
+        day_start = datetime.combine(day, time.min)
+        intervals = []
+        current_time = self.hour_from
+        while current_time < self.hour_to:
+            hour = int(current_time)
+            minute = int((current_time - hour) * 60)
+            slot_start = day_start.replace(hour=hour, minute=minute)
+            intervals.append((slot_start, slot_start + timedelta(minutes=self.slot_duration)))
+            current_time += self.slot_duration / 60.0
+        return intervals
+    
     def name_get(self):
         """Personaliza el nombre mostrado"""
         result = []
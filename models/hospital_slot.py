@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+
+def is_slot_busy(busy_starts, slot_start, slot_stop):
+    """Indica si alguna cita (lista ordenada de inicios) comienza dentro del slot"""
+    index = bisect_left(busy_starts, slot_start)
+    return index < len(busy_starts) and busy_starts[index] < slot_stop
+
+
+class HospitalSlot(models.Model):
+    """Slots de agenda materializados a partir de los horarios de los doctores"""
+    _name = 'hospital.slot'
+    _description = 'Slot de Agenda'
+    _order = 'start'
+    
+    doctor_id = fields.Many2one(
+        'hospital.doctor',
+        string='Doctor',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    schedule_id = fields.Many2one(
+        'hospital.schedule',
+        string='Horario',
+        ondelete='cascade'
+    )
+    start = fields.Datetime(
+        string='Inicio',
+        required=True,
+        index=True
+    )
+    stop = fields.Datetime(
+        string='Fin',
+        required=True
+    )
+    state = fields.Selection([
+        ('free', 'Libre'),
+        ('booked', 'Ocupado'),
+    ], string='Estado', default='free', required=True, index=True)
+    
+    # Constraint SQL (su índice sirve para las búsquedas por doctor y rango)
+    _sql_constraints = [
+        ('doctor_start_unique', 'UNIQUE(doctor_id, start)',
+         'Ya existe un slot para este doctor en ese horario!')
+    ]
+    
+    @api.model
+    def _get_horizon(self):
+        """Última fecha hasta la que los slots están generados"""
+        horizon = self.env['ir.config_parameter'].sudo().get_param('citas_hospital.slot_horizon')
+        return fields.Date.to_date(horizon) if horizon else False
+    
+    @api.model
+    def _cron_generate_slots(self):
+        """Cron: Genera los slots de las próximas semanas y elimina los pasados
+        
+        Los slots anteriores a hoy se conservan los días indicados en
+        citas_hospital.slot_retention_days (0 por defecto).
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        weeks = int(params.get_param('citas_hospital.slot_weeks', 4))
+        retention_days = int(params.get_param('citas_hospital.slot_retention_days', 0))
+        date_from = fields.Date.context_today(self)
+        date_to = date_from + timedelta(weeks=weeks)
+        
+        self._delete_past_slots(date_from - timedelta(days=retention_days))
+        
+        doctors = self.env['hospital.doctor'].search([])
+        self._generate_slots(doctors, date_from, date_to)
+        
+        self.env['ir.config_parameter'].sudo().set_param(
+            'citas_hospital.slot_horizon', fields.Date.to_string(date_to)
+        )
+    
+    @api.model
+    def _delete_past_slots(self, date_limit):
+        """Elimina en una sola sentencia los slots que comienzan antes de la fecha indicada"""
+        self.env.flush_all()
+        self.env.cr.execute(
+            "DELETE FROM hospital_slot WHERE start < %s",
+            [datetime.combine(date_limit, time.min)]
+        )
+        self.invalidate_model()
+    
+    @api.model
+    def _generate_slots(self, doctors, date_from, date_to):
+        """Sincroniza los slots de los doctores con sus horarios en un rango de fechas"""
+        if not doctors:
+            return
+        
+        schedules_by_day = defaultdict(lambda: self.env['hospital.schedule'])
+        for schedule in self.env['hospital.schedule'].search([
+            ('doctor_id', 'in', doctors.ids),
+            ('active', '=', True)
+        ]):
+            schedules_by_day[schedule.day_of_week] |= schedule
+        
+        expected = {}
+        day = date_from
+        while day <= date_to:
+            for schedule in schedules_by_day[str(day.weekday())]:
+                for start, stop in schedule._get_slot_intervals(day):
+                    expected[schedule.doctor_id.id, start] = (stop, schedule.id)
+            day += timedelta(days=1)
+        
+        dt_from = datetime.combine(date_from, time.min)
+        dt_to = datetime.combine(date_to + timedelta(days=1), time.min)
+        existing = self.search([
+            ('doctor_id', 'in', doctors.ids),
+            ('start', '>=', dt_from),
+            ('start', '<', dt_to),
+        ])
+        
+        obsolete_ids = []
+        for slot in existing:
+            key = (slot.doctor_id.id, slot.start)
+            if key not in expected:
+                obsolete_ids.append(slot.id)
+                continue
+            stop, schedule_id = expected.pop(key)
+            if slot.stop != stop or slot.schedule_id.id != schedule_id:
+                slot.write({'stop': stop, 'schedule_id': schedule_id})
+        self.browse(obsolete_ids).unlink()
+        
+        self.create([{
+            'doctor_id': doctor_id,
+            'schedule_id': schedule_id,
+            'start': start,
+            'stop': stop,
+        } for (doctor_id, start), (stop, schedule_id) in expected.items()])
+        
+        self._sync_state(doctors.ids, dt_from, dt_to)
+    
+    @api.model
+    def _sync_slot_keys(self, keys):
+        """Recalcula el estado de los slots de los pares (doctor_id, fecha) indicados"""
+        doctor_ids_by_day = defaultdict(set)
+        for doctor_id, day in keys:
+            doctor_ids_by_day[day].add(doctor_id)
+        
+        for day, doctor_ids in doctor_ids_by_day.items():
+            self._sync_state(
+                list(doctor_ids),
+                datetime.combine(day, time.min),
+                datetime.combine(day + timedelta(days=1), time.min),
+            )
+    
+    @api.model
+    def _sync_state(self, doctor_ids, dt_from, dt_to):
+        """Marca como libres u ocupados los slots que comienzan en el rango"""
+        slots = self.search([
+            ('doctor_id', 'in', doctor_ids),
+            ('start', '>=', dt_from),
+            ('start', '<', dt_to),
+        ])
+        if not slots:
+            return
+        
+        busy = defaultdict(list)
+        for appointment in self.env['hospital.appointment'].search_read([
+            ('doctor_id', 'in', doctor_ids),
+            ('appointment_date', '>=', dt_from),
+            ('appointment_date', '<', max(slots.mapped('stop'))),
+            ('state', 'in', ['draft', 'confirmed', 'in_progress'])
+        ], ['doctor_id', 'appointment_date']):
+            busy[appointment['doctor_id'][0]].append(appointment['appointment_date'])
+        for starts in busy.values():
+            starts.sort()
+        
+        booked_ids = []
+        free_ids = []
+        for slot in slots:
+            if is_slot_busy(busy[slot.doctor_id.id], slot.start, slot.stop):
+                if slot.state != 'booked':
+                    booked_ids.append(slot.id)
+            elif slot.state != 'free':
+                free_ids.append(slot.id)
+        
+        self.browse(booked_ids).write({'state': 'booked'})
+        self.browse(free_ids).write({'state': 'free'})
+    
+    def name_get(self):
+        """Personaliza el nombre mostrado"""
+        result = []
+        for record in self:
+            name = f"{record.doctor_id.name} {record.start.strftime('%d/%m/%Y %H:%M')}"
+            result.append((record.id, name))
+        return result
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from datetime import datetime, time, timedelta
+from psycopg2 import errors as pg_errors
+import secrets
+
+
+class HospitalSlotHold(models.Model):
+    """Reserva temporal de un slot mientras el paciente completa la reserva"""
+    _name = 'hospital.slot.hold'
+    _description = 'Reserva Temporal de Slot'
+    _order = 'start'
+    
+    doctor_id = fields.Many2one(
+        'hospital.doctor',
+        string='Doctor',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    start = fields.Datetime(
+        string='Inicio',
+        required=True
+    )
+    token = fields.Char(
+        string='Token',
+        required=True,
+        index=True,
+        copy=False
+    )
+    expiration = fields.Datetime(
+        string='Expira',
+        required=True,
+        index=True
+    )
+    ip_address = fields.Char(
+        string='Dirección IP',
+        index=True,
+        help='Dirección del visitante que creó la reserva temporal'
+    )
+    
+    # Constraint SQL
+    _sql_constraints = [
+        ('doctor_start_unique', 'UNIQUE(doctor_id, start)',
+         'El horario seleccionado está reservado temporalmente!')
+    ]
+    
+    @api.model
+    def _create_hold(self, doctor_id, start, release_token=None, ip_address=None):
+        """Reserva temporalmente un slot libre y devuelve el hold creado
+        
+        Si se indica release_token se libera antes el hold anterior del
+        mismo paciente. Cada dirección IP puede tener como máximo
+        citas_hospital.slot_hold_max_per_ip holds vigentes (5 por defecto).
+        """
+        if release_token:
+            self.search([('token', '=', release_token)]).unlink()
+        
+        params = self.env['ir.config_parameter'].sudo()
+        now = datetime.now()
+        if ip_address:
+            max_per_ip = int(params.get_param('citas_hospital.slot_hold_max_per_ip', 5))
+            if self.search_count([('ip_address', '=', ip_address), ('expiration', '>', now)]) >= max_per_ip:
+                raise UserError(_('Tiene demasiados horarios reservados temporalmente. Complete o espere a que expiren.'))
+        
+        doctor = self.env['hospital.doctor'].browse(doctor_id)
+        available = {slot['datetime'] for slot in doctor._get_available_slots(start.date())}
+        if start.strftime('%Y-%m-%d %H:%M:%S') not in available:
+            raise UserError(_('El horario seleccionado ya no está disponible.'))
+        
+        self.search([
+            ('doctor_id', '=', doctor_id),
+            ('start', '=', start),
+            ('expiration', '<=', now),
+        ]).unlink()
+        
+        minutes = int(params.get_param('citas_hospital.slot_hold_minutes', 10))
+        try:
+            with self.env.cr.savepoint():
+                return self.create({
+                    'doctor_id': doctor_id,
+                    'start': start,
+                    'token': secrets.token_urlsafe(16),
+                    'expiration': now + timedelta(minutes=minutes),
+                    'ip_address': ip_address,
+                })
+        except pg_errors.UniqueViolation:
+            raise UserError(_('El horario seleccionado está reservado temporalmente.'))
+    
+    @api.model
+    def _get_held_starts(self, doctor_ids, date_from, date_to):
+        """Pares (doctor_id, inicio) con un hold vigente en el rango de fechas"""
+        holds = self.search_read([
+            ('doctor_id', 'in', doctor_ids),
+            ('start', '>=', datetime.combine(date_from, time.min)),
+            ('start', '<', datetime.combine(date_to + timedelta(days=1), time.min)),
+            ('expiration', '>', datetime.now()),
+        ], ['doctor_id', 'start'])
+        return {(hold['doctor_id'][0], hold['start']) for hold in holds}
+    
+    @api.model
+    def _check_holds(self, bookings):
+        """Verifica los holds de las reservas [(doctor_id, inicio, token)]
+        
+        Devuelve los pares (doctor_id, inicio) retenidos con otro token, que
+        no deben reservarse. Los holds propios se liberan con _release_holds
+        una vez creada la cita.
+        """
+        if not bookings:
+            return set()
+        
+        holds = self.search([
+            ('doctor_id', 'in', list({doctor_id for doctor_id, start, token in bookings})),
+            ('start', 'in', list({start for doctor_id, start, token in bookings})),
+            ('expiration', '>', datetime.now()),
+        ])
+        tokens = {(hold.doctor_id.id, hold.start): hold.token for hold in holds}
+        return {
+            (doctor_id, start)
+            for doctor_id, start, token in bookings
+            if (doctor_id, start) in tokens and tokens[doctor_id, start] != token
+        }
+    
+    @api.model
+    def _get_live_hold(self, token, doctor_id, start):
+        """Hold vigente con el token indicado para el slot, o un recordset vacío"""
+        if not token:
+            return self.browse()
+        return self.search([
+            ('token', '=', token),
+            ('doctor_id', '=', doctor_id),
+            ('start', '=', start),
+            ('expiration', '>', datetime.now()),
+        ], limit=1)
+    
+    @api.model
+    def _release_holds(self, bookings):
+        """Elimina los holds propios de las reservas [(doctor_id, inicio, token)] ya creadas"""
+        keys = {(doctor_id, start, token) for doctor_id, start, token in bookings if token}
+        if not keys:
+            return
+        holds = self.search([('token', 'in', list({token for doctor_id, start, token in keys}))])
+        holds.filtered(lambda hold: (hold.doctor_id.id, hold.start, hold.token) in keys).unlink()
+    
+    @api.model
+    def _cron_sweep_expired(self):
+        """Cron: Elimina los holds expirados"""
+        # Borrado directo en SQL: los holds no tienen lógica asociada
+        self.env.cr.execute(
+            "DELETE FROM hospital_slot_hold WHERE expiration < %s", [datetime.now()]
+        )
@@ -2,6 +2,9 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from datetime import timedelta
+from itertools import islice
+import heapq
 
 
 class HospitalSpecialty(models.Model):
@@ -60,8 +63,48 @@ class HospitalSpecialty(models.Model):
     @api.depends('doctor_ids')
     def _compute_doctor_count(self):
         """Cuenta la cantidad de doctores en esta especialidad"""
+        counts = {}
+        if self.ids:
+            counts = {
+                specialty.id: count
+                for specialty, count in self.env['hospital.doctor']._read_group(
+                    [('specialty_ids', 'in', self.ids)], ['specialty_ids'], ['__count']
+                )
+            }
         for record in self:
-            record.doctor_count = len(record.doctor_ids)
+            record.doctor_count = counts.get(record.id, 0)
+    
+    def _find_first_available_slots(self, limit=5, date_from=None, max_days=60, chunk_days=7):
+        """Busca los primeros slots libres entre los doctores activos de la especialidad
+        
+        Cada doctor aporta un flujo ordenado de slots calculado por bloques de
+        días bajo demanda. heapq.merge combina los flujos y la búsqueda se
+        detiene en cuanto se reúnen limit resultados. El primer bloque de todos
+        los doctores se calcula en una sola pasada.
+        """
+        self.ensure_one()
+        date_from = date_from or fields.Date.context_today(self)
+        date_to = date_from + timedelta(days=max_days - 1)
+        
+        doctors = self.env['hospital.doctor'].search([
+            ('specialty_ids', 'in', self.ids),
+            ('active', '=', True)
+        ])
+        if not doctors:
+            return []
+        
+        first_to = min(date_from + timedelta(days=chunk_days - 1), date_to)
+        first_chunks = doctors._get_availability(date_from, first_to)
+        streams = [
+            doctor._iter_available_slots(date_from, date_to, first_chunks[doctor.id], chunk_days)
+            for doctor in doctors
+        ]
+        
+        doctor_names = {doctor.id: doctor.name for doctor in doctors}
+        return [
+            dict(slot, doctor_id=doctor_id, doctor_name=doctor_names[doctor_id])
+            for slot_datetime, doctor_id, slot in islice(heapq.merge(*streams), limit)
+        ]
     
     @api.constrains('appointment_duration')
     def _check_appointment_duration(self):
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+import threading
+
+_lock = threading.Lock()
+# {(dbname, sequence_id, write_date): números reservados por este worker}
+# write_date en la clave descarta los bloques al modificar la secuencia
+_blocks = {}
+
+
+class IrSequence(models.Model):
+    """Extensión de secuencias para numerar registros creados en lote"""
+    _inherit = 'ir.sequence'
+    
+    @api.model
+    def _next_by_code_batch(self, sequence_code, count):
+        """Devuelve count números de la secuencia con el código indicado
+        
+        Equivale a llamar count veces a next_by_code, pero las secuencias
+        estándar toman los números de un bloque reservado por el worker.
+        """
+        if count <= 0:
+            return []
+        sequence = self.search([
+            ('code', '=', sequence_code),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not sequence:
+            return [False] * count
+        return sequence._next_batch(count)
+    
+    def _next_batch(self, count):
+        """Devuelve count números de la secuencia ya formateados
+        
+        Cada worker reserva con un solo nextval por bloque los números de
+        varias llamadas (parámetro citas_hospital.sequence_block_size, 0 para
+        no reservar). Los números son únicos entre workers pero pueden no ser
+        correlativos en el tiempo, y los no usados quedan como huecos, como
+        ya ocurre con las secuencias estándar.
+        """
+        self.ensure_one()
+        if self.implementation != 'standard' or self.use_date_range:
+            return [self._next() for _ in range(count)]
+        
+        key = (self.env.cr.dbname, self.id, self.write_date)
+        with _lock:
+            reserved = _blocks.get(key, [])
+            numbers = reserved[:count]
+            del reserved[:count]
+        
+        missing = count - len(numbers)
+        if missing:
+            block_size = int(self.env['ir.config_parameter'].sudo().get_param(
+                'citas_hospital.sequence_block_size', 20
+            ))
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                ['ir_sequence_%03d' % self.id, missing + max(block_size, 0)]
+            )
+            fetched = [row[0] for row in self.env.cr.fetchall()]
+            numbers += fetched[:missing]
+            with _lock:
+                for stale in [k for k in _blocks if k[:2] == key[:2] and k != key]:
+                    del _blocks[stale]
+                _blocks.setdefault(key, []).extend(fetched[missing:])
+        
+        return [self.get_next_char(number) for number in numbers]
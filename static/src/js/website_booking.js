@@ -33,9 +33,75 @@
         }
     });
 
+    // Disponibilidad por día del doctor seleccionado (fecha -> {free_count, slots})
+    var availabilityByDate = {};
+    var AVAILABILITY_DAYS = 30;
+
+    function formatDate(date) {
+        // Fecha local YYYY-MM-DD (toISOString convierte a UTC)
+        var month = String(date.getMonth() + 1).padStart(2, '0');
+        var day = String(date.getDate()).padStart(2, '0');
+        return date.getFullYear() + '-' + month + '-' + day;
+    }
+
+    function renderSlots(slots) {
+        var $timeSelect = $('#appointment_time');
+        $timeSelect.empty();
+        if (slots.length === 0) {
+            $timeSelect.append('<option value="">No hay horarios disponibles</option>');
+        } else {
+            $timeSelect.append('<option value="">-- Seleccione --</option>');
+            slots.forEach(function(slot) {
+                $timeSelect.append($('<option>', {
+                    value: slot.datetime,
+                    text: slot.time
+                }));
+            });
+        }
+        $timeSelect.prop('disabled', false);
+    }
+
+    // Carga en una sola llamada la disponibilidad de los próximos días
+    function loadAvailability(doctorId) {
+        var dateFrom = new Date();
+        var dateTo = new Date();
+        dateTo.setDate(dateTo.getDate() + AVAILABILITY_DAYS);
+        $.ajax({
+            url: '/appointments/booking/get_availability',
+            type: 'POST',
+            contentType: 'application/json',
+            data: JSON.stringify({
+                jsonrpc: "2.0",
+                method: "call",
+                params: {
+                    doctor_id: doctorId,
+                    date_from: formatDate(dateFrom),
+                    date_to: formatDate(dateTo)
+                }
+            }),
+            success: function(response) {
+                // Descartar respuestas de un doctor que ya no está seleccionado
+                if (String(doctorId) !== $('#doctor_id').val()) {
+                    return;
+                }
+                if (!response.result || !response.result.days) {
+                    return;
+                }
+                response.result.days.forEach(function(day) {
+                    availabilityByDate[day.date] = day;
+                });
+                $('#appointment_date')
+                    .attr('min', formatDate(dateFrom))
+                    .attr('max', formatDate(dateTo));
+            }
+        });
+    }
+
     // Cuando cambia el doctor, habilitar fecha
     $('#doctor_id').on('change', function() {
+        availabilityByDate = {};
         if ($(this).val()) {
+            loadAvailability($(this).val());
             $('#appointment_date').prop('disabled', false);
         }
     });
@@ -44,7 +110,12 @@
     $('#appointment_date').on('change', function() {
         var doctorId = $('#doctor_id').val();
         var date = $(this).val();
-        if (doctorId && date) {
+        var day = availabilityByDate[date];
+        // Marca como inválidos los días sin horarios libres
+        this.setCustomValidity(day && day.free_count === 0 ? 'No hay horarios disponibles para este día' : '');
+        if (day) {
+            renderSlots(day.slots);
+        } else if (doctorId && date) {
             $.ajax({
                 url: '/appointments/booking/get_slots',
                 type: 'POST',
@@ -55,23 +126,43 @@
                     params: {doctor_id: doctorId, date: date}
                 }),
                 success: function(response) {
-                    var slots = response.result;
-                    var $timeSelect = $('#appointment_time');
-                    $timeSelect.empty();
-                    if (slots.length === 0) {
-                        $timeSelect.append('<option value="">No hay horarios disponibles</option>');
-                    } else {
-                        $timeSelect.append('<option value="">-- Seleccione --</option>');
-                        slots.forEach(function(slot) {
-                            $timeSelect.append($('<option>', {
-                                value: slot.datetime,
-                                text: slot.time
-                            }));
-                        });
+                    if (doctorId !== $('#doctor_id').val() || date !== $('#appointment_date').val()) {
+                        return;
                     }
-                    $timeSelect.prop('disabled', false);
+                    renderSlots(response.result);
                 }
             });
         }
     });
+    // Cuando se elige un horario, retenerlo mientras se completa la reserva
+    $('#appointment_time').on('change', function() {
+        var doctorId = $('#doctor_id').val();
+        var datetime = $(this).val();
+        if (!doctorId || !datetime) {
+            return;
+        }
+        $.ajax({
+            url: '/appointments/booking/hold',
+            type: 'POST',
+            contentType: 'application/json',
+            data: JSON.stringify({
+                jsonrpc: "2.0",
+                method: "call",
+                params: {
+                    doctor_id: doctorId,
+                    datetime_str: datetime
+                }
+            }),
+            success: function(response) {
+                var result = response.result || {};
+                if (result.error) {
+                    alert(result.error);
+                    // El horario ya no está libre: recargar la disponibilidad
+                    delete availabilityByDate[$('#appointment_date').val()];
+                    loadAvailability(doctorId);
+                    $('#appointment_date').trigger('change');
+                }
+            }
+        });
+    });
 })();
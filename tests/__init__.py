@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import test_appointment
+from . import test_patient
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import TransactionCase
+from odoo.exceptions import ValidationError
+from datetime import datetime, timedelta
+
+
+class TestAppointment(TransactionCase):
+    
+    def setUp(self):
+        super(TestAppointment, self).setUp()
+        
+        # Crear datos de prueba
+        self.patient = self.env['hospital.patient'].create({
+            'name': 'Paciente Test',
+            'identification_id': '12345678',
+        })
+        
+        self.specialty = self.env['hospital.specialty'].create({
+            'name': 'Cardiología',
+            'code': 'CARD',
+        })
+        
+        self.doctor = self.env['hospital.doctor'].create({
+            'name': 'Dr. Test',
+            'license_number': 'LIC001',
+            'specialty_ids': [(6, 0, [self.specialty.id])],
+        })
+        
+        self.start = (datetime.now() + timedelta(days=2)).replace(hour=9, minute=0, second=0, microsecond=0)
+    
+    def _create_appointment(self, start, **vals):
+        return self.env['hospital.appointment'].create(dict({
+            'patient_id': self.patient.id,
+            'doctor_id': self.doctor.id,
+            'specialty_id': self.specialty.id,
+            'appointment_date': start,
+            'duration': 0.5,
+        }, **vals))
+    
+    def _drop_overlap_constraint(self):
+        """Elimina la restricción de exclusión dentro de la transacción del test"""
+        self.env.cr.execute(
+            "ALTER TABLE hospital_appointment DROP CONSTRAINT hospital_appointment_doctor_no_overlap"
+        )
+        self.env.registry.clear_cache()
+        self.addCleanup(self.env.registry.clear_cache)
+    
+    def test_create_appointment(self):
+        """Test creación de cita"""
+        appointment = self._create_appointment(self.start)
+        
+        self.assertTrue(appointment.name)
+        self.assertEqual(appointment.state, 'draft')
+    
+    def test_overlap_constraint_exists(self):
+        """Test la restricción de no solapamiento está creada"""
+        self.assertTrue(self.env['hospital.appointment']._has_overlap_constraint())
+    
+    def test_confirm_overlapping(self):
+        """Test confirmar una cita solapada con otra confirmada"""
+        self._create_appointment(self.start).action_confirm()
+        overlapping = self._create_appointment(self.start + timedelta(minutes=15))
+        
+        with self.assertRaises(ValidationError):
+            overlapping.action_confirm()
+    
+    def test_confirm_overlapping_same_batch(self):
+        """Test confirmar en lote dos citas solapadas entre sí"""
+        appointments = self._create_appointment(self.start) | self._create_appointment(self.start + timedelta(minutes=15))
+        
+        with self.assertRaises(ValidationError):
+            appointments.action_confirm()
+    
+    def test_confirm_adjacent(self):
+        """Test confirmar en lote citas consecutivas sin solapamiento"""
+        appointments = self._create_appointment(self.start) | self._create_appointment(self.start + timedelta(minutes=30))
+        appointments.action_confirm()
+        
+        self.assertEqual(set(appointments.mapped('state')), {'confirmed'})
+    
+    def test_create_confirmed_overlapping(self):
+        """Test crear confirmada una cita solapada"""
+        self._create_appointment(self.start, state='confirmed')
+        
+        with self.assertRaises(ValidationError):
+            self._create_appointment(self.start + timedelta(minutes=15), state='confirmed')
+    
+    def test_fallback_without_constraint(self):
+        """Test verificación en Python cuando falta la restricción de exclusión"""
+        self._drop_overlap_constraint()
+        self.assertFalse(self.env['hospital.appointment']._has_overlap_constraint())
+        
+        self._create_appointment(self.start).action_confirm()
+        with self.assertRaises(ValidationError):
+            self._create_appointment(self.start + timedelta(minutes=15)).action_confirm()
+        with self.assertRaises(ValidationError):
+            (self._create_appointment(self.start + timedelta(hours=1))
+             | self._create_appointment(self.start + timedelta(hours=1, minutes=15))).action_confirm()
+        with self.assertRaises(ValidationError):
+            self._create_appointment(self.start, state='confirmed')
+    
+    def test_deferred_calendar_sync(self):
+        """Test la sincronización diferida escribe el evento al ejecutar precommit"""
+        appointment = self._create_appointment(self.start)
+        appointment.action_confirm()
+        event = appointment.calendar_event_id
+        self.assertTrue(event)
+        self.env.flush_all()
+        
+        new_start = self.start + timedelta(hours=3)
+        appointment.with_context(
+            defer_calendar_sync=True, tracking_disable=True, mail_notrack=True
+        ).write({'appointment_date': new_start})
+        
+        query = "SELECT start FROM calendar_event WHERE id = %s"
+        self.env.cr.execute(query, [event.id])
+        self.assertEqual(self.env.cr.fetchone()[0], self.start)
+        
+        self.env.cr.precommit.run()
+        self.env.cr.execute(query, [event.id])
+        self.assertEqual(self.env.cr.fetchone()[0], new_start)
+    
+    def test_appointment_past_date(self):
+        """Test validación de fecha pasada"""
+        with self.assertRaises(ValidationError):
+            self._create_appointment(datetime.now() - timedelta(days=1))
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import TransactionCase
+from odoo.exceptions import ValidationError
+from odoo.tools import mute_logger
+from psycopg2 import IntegrityError
+from unittest.mock import patch
+import importlib.util
+import os
+
+MIGRATION_PATH = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'migrations', '18.0.1.1.0', 'pre-migrate.py'
+)
+
+
+class TestPatient(TransactionCase):
+    
+    def setUp(self):
+        super(TestPatient, self).setUp()
+        
+        self.Patient = self.env['hospital.patient']
+        # Crear datos de prueba
+        self.patient = self.Patient.create({
+            'name': 'Paciente Test',
+            'identification_id': '12.345.678',
+        })
+    
+    def test_identification_normalized(self):
+        """Test normalización de la identificación"""
+        self.assertEqual(self.patient.identification_normalized, '12345678')
+    
+    @mute_logger('odoo.sql_db')
+    def test_identification_normalized_unique(self):
+        """Test identificaciones que solo difieren en separadores"""
+        with self.assertRaises(IntegrityError):
+            self.Patient.create({
+                'name': 'Paciente Duplicado',
+                'identification_id': '12345678',
+            })
+    
+    def test_separator_only_identifications(self):
+        """Test identificaciones sin dígitos ni letras no chocan"""
+        patients = self.Patient.create([
+            {'name': 'Paciente Guion', 'identification_id': '-'},
+            {'name': 'Paciente Punto', 'identification_id': '.'},
+        ])
+        
+        self.assertEqual(patients.mapped('identification_normalized'), [False, False])
+    
+    def test_resolve_existing_patient(self):
+        """Test resolución reutiliza el paciente con la misma identificación normalizada"""
+        result = self.Patient._resolve_patients([{
+            'name': 'Paciente Test',
+            'identification_id': '12345678',
+        }])
+        
+        self.assertEqual(result, {'12345678': self.patient})
+    
+    def test_resolve_new_patients_batch(self):
+        """Test resolución en lote de un paciente nuevo enviado con dos formatos"""
+        result = self.Patient._resolve_patients([
+            {'name': 'Paciente Nuevo', 'identification_id': '87.654.321', 'email': 'nuevo@example.com'},
+            {'name': 'Paciente Nuevo', 'identification_id': '87654321'},
+        ])
+        
+        patient = result['87.654.321']
+        self.assertEqual(result['87654321'], patient)
+        self.assertEqual(self.Patient.search_count([('identification_normalized', '=', '87654321')]), 1)
+        self.assertTrue(patient.active)
+        self.assertEqual(patient.partner_id.email, 'nuevo@example.com')
+    
+    def test_resolve_invalid_email(self):
+        """Test resolución valida las restricciones del modelo"""
+        with self.assertRaises(ValidationError):
+            self.Patient._resolve_patients([{
+                'name': 'Paciente Email',
+                'identification_id': '55555555',
+                'email': 'sin-arroba',
+            }])
+        
+        self.assertFalse(self.Patient.search([('identification_normalized', '=', '55555555')]))
+    
+    @mute_logger('odoo.sql_db')
+    def test_resolve_concurrent_creation(self):
+        """Test resolución cuando otra transacción ya creó el paciente"""
+        search = type(self.Patient)._search_by_identification
+        calls = []
+        
+        def search_after_creation(model, keys):
+            # La primera búsqueda no ve al paciente, como si lo hubiera
+            # creado una transacción concurrente
+            calls.append(keys)
+            return {} if len(calls) == 1 else search(model, keys)
+        
+        with patch.object(type(self.Patient), '_search_by_identification', autospec=True, side_effect=search_after_creation):
+            result = self.Patient._resolve_patients([{
+                'name': 'Paciente Test',
+                'identification_id': '12345678',
+            }])
+        
+        self.assertEqual(result['12345678'], self.patient)
+        self.assertEqual(self.Patient.search_count([('identification_normalized', '=', '12345678')]), 1)
+    
+    def test_migration_reports_duplicates(self):
+        """Test la migración no fusiona ni elimina pacientes duplicados"""
+        duplicate = self.Patient.create({
+            'name': 'Paciente Duplicado',
+            'identification_id': '99999999',
+            'allergies': 'Penicilina',
+        })
+        # Duplicado previo a la restricción única de identificación normalizada
+        self.env.flush_all()
+        self.env.cr.execute(
+            "UPDATE hospital_patient SET identification_id = '12345678', identification_normalized = NULL WHERE id = %s",
+            [duplicate.id]
+        )
+        
+        spec = importlib.util.spec_from_file_location('citas_hospital_pre_migrate', MIGRATION_PATH)
+        migration = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migration)
+        with self.assertLogs(level='WARNING') as logs:
+            migration._normalize_identifications(self.env.cr)
+        self.env.invalidate_all()
+        
+        self.assertIn('12345678', logs.output[0])
+        self.assertEqual(self.patient.identification_normalized, '12345678')
+        self.assertTrue(duplicate.exists())
+        self.assertFalse(duplicate.identification_normalized)
+        self.assertEqual(duplicate.allergies, 'Penicilina')